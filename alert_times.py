@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""
+Monte Carlo distribution of early-warning alert times.
+
+Sources are drawn uniformly in volume out to the distance at which the
+loudest of them would just reach threshold, with isotropic orientations and
+sky positions and component masses uniform in a range. Each source's SNR
+accumulated up to the time t before coalescence follows from the cumulative
+integral of f^(-7/3) / S(f) up to the frequency it reaches at t, which is
+tabulated once for the PSD; a source is detected at the time its
+accumulated SNR crosses the threshold, and the alert goes out a pipeline
+latency later. The antenna pattern is that of a single L-shaped detector.
+
+Sources are simulated in chunks, each from its own seeded random stream,
+optionally in parallel; only a histogram of alert times is kept, so memory
+does not grow with the number of sources, and the result depends on the
+seed and chunk size but not on the number of worker processes.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('AlertTimes', 'snr_table', 'simulate')
+
+from collections import namedtuple
+import numpy
+from inspiral import chirp_mass, isco_frequency, horizon, freq_to_time
+from snr import power_law_moments
+
+
+AlertTimes = namedtuple('AlertTimes', 'bins counts under over late num_detected num_sources max_distance')
+AlertTimes.__doc__ = """Result of simulate.
+
+bins: edges of the histogram bins of alert time in seconds before
+	coalescence, increasing
+counts: number of detected sources whose alert time falls in each bin
+under: number of detected sources alerted before coalescence, but less
+	than bins[0] seconds before it
+over: number of detected sources alerted more than bins[-1] seconds
+	before coalescence
+late: number of detected sources whose alert comes after coalescence
+num_detected: number of sources that reach the threshold at all, which is
+	counts.sum() + under + over + late
+num_sources: number of sources simulated
+max_distance: radius in Mpc of the simulated volume"""
+
+
+def snr_table(f, asd, f_low, f_high, num_points=1000):
+	"""Log-spaced frequencies from f_low to f_high in Hz and the cumulative
+	integral 4 int_{f_low}^{f} f'^(-7/3) / S(f') df' at each of them, for
+	the PSD S = asd**2 sampled at frequencies f."""
+	grid = numpy.logspace(numpy.log10(f_low), numpy.log10(f_high), num_points)
+	grid, moments = power_law_moments(f, asd, (-7./3,), f_low, f_high, grid)
+	return grid, moments[0]
+
+
+def _antenna_factor(random, n):
+	"""Ratio of the SNR of sources with random sky positions, polarizations
+	and inclinations to that of optimally oriented ones."""
+	cos_theta = random.uniform(-1, 1, n)
+	phi = random.uniform(0, 2 * numpy.pi, n)
+	psi = random.uniform(0, 2 * numpy.pi, n)
+	cos_iota = random.uniform(-1, 1, n)
+	a = 0.5 * (1 + cos_theta**2) * numpy.cos(2 * phi)
+	b = cos_theta * numpy.sin(2 * phi)
+	Fplus = a * numpy.cos(2 * psi) - b * numpy.sin(2 * psi)
+	Fcross = a * numpy.sin(2 * psi) + b * numpy.cos(2 * psi)
+	return numpy.sqrt((Fplus * 0.5 * (1 + cos_iota**2))**2 + (Fcross * cos_iota)**2)
+
+
+def _alert_times(random, n, table, mass_range, max_distance, threshold, latency):
+	"""Alert times in seconds before coalescence of n random sources; NaN for
+	those that are never detected."""
+	grid, cumulative = table
+	m1 = random.uniform(mass_range[0], mass_range[1], n)
+	m2 = random.uniform(mass_range[0], mass_range[1], n)
+	distance = max_distance * random.uniform(0, 1, n) ** (1./3)
+	Mc = chirp_mass(m1, m2)
+	f_isco = numpy.minimum(isco_frequency(m1, m2), grid[-1])
+	C_isco = numpy.interp(f_isco, grid, cumulative)
+	final_snr = horizon(Mc, C_isco, 1.) / distance * _antenna_factor(random, n)
+
+	# The accumulated SNR is final_snr * sqrt(C(f) / C_isco); invert C to
+	# find the frequency at which it crosses the threshold.
+	with numpy.errstate(divide='ignore'):
+		target = C_isco * (threshold / final_snr)**2
+	f_cross = numpy.interp(target, cumulative, grid)
+	t = freq_to_time(Mc, f_cross) - latency
+	t[final_snr < threshold] = numpy.nan
+	return t
+
+
+def _simulate_chunk(args):
+	seed, chunk, n, table, mass_range, max_distance, threshold, latency, bins = args
+	random = numpy.random.Generator(numpy.random.PCG64(
+		numpy.random.SeedSequence(seed, spawn_key=(chunk,))))
+	t = _alert_times(random, n, table, mass_range, max_distance, threshold, latency)
+	t = t[numpy.isfinite(t)]
+	counts = numpy.histogram(t[t >= 0], bins)[0]
+	under = numpy.sum((t >= 0) & (t < bins[0]))
+	over = numpy.sum(t > bins[-1])
+	return counts, under, over, numpy.sum(t < 0), len(t)
+
+
+def simulate(f, asd, num_sources, f_low=10., mass_range=(1.4, 1.4),
+		threshold=8., latency=0., bins=None, seed=0, chunk_size=1 << 18,
+		processes=None):
+	"""Simulate num_sources sources for the PSD S = asd**2 sampled at
+	frequencies f, with component masses uniform in mass_range (in M_sun),
+	a detection SNR threshold, and a pipeline latency in seconds.
+
+	bins: edges of the alert time histogram, by default 200 bins
+		log-spaced from 0.01 s to 10^4 s; alerts outside the bins are
+		counted in the under and over fields of the result
+	seed, chunk_size: the sources are drawn in chunks of chunk_size, each
+		from a stream spawned from seed
+	processes: if given, the number of worker processes
+
+	Returns an AlertTimes."""
+	if bins is None:
+		bins = numpy.logspace(-2, 4, 201)
+	f_high = isco_frequency(mass_range[0], mass_range[0])
+	table = snr_table(f, asd, f_low, f_high)
+	# Nothing beyond the horizon of the most massive binary can be detected.
+	Mc_max = chirp_mass(mass_range[1], mass_range[1])
+	max_distance = float(horizon(Mc_max,
+		numpy.interp(isco_frequency(mass_range[1], mass_range[1]), *table), threshold))
+
+	sizes = [min(chunk_size, num_sources - i) for i in range(0, num_sources, chunk_size)]
+	work = [(seed, chunk, n, table, mass_range, max_distance, threshold, latency, bins)
+		for chunk, n in enumerate(sizes)]
+	if processes:
+		from multiprocessing import Pool
+		pool = Pool(processes)
+		try:
+			results = pool.map(_simulate_chunk, work, chunksize=1)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		results = map(_simulate_chunk, work)
+
+	counts = numpy.zeros(len(bins) - 1, dtype=numpy.int64)
+	under = over = late = detected = 0
+	for chunk_counts, chunk_under, chunk_over, chunk_late, chunk_detected in results:
+		counts += chunk_counts
+		under += chunk_under
+		over += chunk_over
+		late += chunk_late
+		detected += chunk_detected
+	return AlertTimes(bins, counts, under, over, late, detected, num_sources, max_distance)
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	import sys
+	from noisemodels import asds
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options]', option_list = [
+		Option("--noise-model", default="zero det., high power",
+			help="name of noise model in noisemodels.asds (default: %default)"),
+		Option("--num-sources", type="int", default=1000000,
+			help="number of sources to simulate (default: %default)"),
+		Option("--flow", type="float", default=10., metavar="Hz",
+			help="low frequency cutoff (default: %default)"),
+		Option("--min-mass", type="float", default=1.4, metavar="solar masses",
+			help="minimum component mass (default: %default)"),
+		Option("--max-mass", type="float", default=1.4, metavar="solar masses",
+			help="maximum component mass (default: %default)"),
+		Option("--threshold", type="float", default=8.,
+			help="detection SNR threshold (default: %default)"),
+		Option("--latency", type="float", default=0., metavar="seconds",
+			help="pipeline latency (default: %default)"),
+		Option("--seed", type="int", default=0,
+			help="random seed (default: %default)"),
+		Option("--processes", "-j", type="int", default=None,
+			help="number of worker processes (default: run serially)"),
+	]).parse_args()
+	if len(args) > 0:
+		raise ValueError("Too many arguments")
+
+	f, asd = asds[opts.noise_model].T
+	result = simulate(f, asd, opts.num_sources, opts.flow, (opts.min_mass, opts.max_mass),
+		opts.threshold, opts.latency, seed=opts.seed, processes=opts.processes)
+	sys.stdout.write("%d of %d sources detected within %.0f Mpc; %d alerts after coalescence\n" % (
+		result.num_detected, result.num_sources, result.max_distance, result.late))
+	sys.stdout.write("alert time (s)  fraction of detected sources alerted at least this early\n")
+	early = (result.over + numpy.cumsum(result.counts[::-1])[::-1]) / float(max(result.num_detected, 1))
+	for t in (100., 25., 10., 1., 0.1):
+		sys.stdout.write("%14g  %.3f\n" % (t, numpy.interp(numpy.log(t), numpy.log(result.bins[:-1]), early)))
@@ -0,0 +1,77 @@
+"""
+Columnar cache of the SnglInspiral tables of LIGO_LW template bank files.
+
+The first time a bank is read, every column of its sngl_inspiral table is
+extracted into a .npy file of the matching NumPy type in
+data/cache/banks/<SHA-1 of the file>/. Later reads of the same file, under
+any name, memory-map the requested columns without parsing any XML. Editing
+the file changes its hash, so a stale cache is never used.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('file_hash', 'load_columns')
+
+import hashlib
+import os
+import os.path
+import numpy
+from stages import stage
+
+default_cache_dir = os.path.join(
+	os.path.dirname(os.path.abspath(__file__)), 'data', 'cache', 'banks')
+
+
+def file_hash(path, block_size=1 << 20):
+	"""SHA-1 hex digest of the contents of a file."""
+	sha = hashlib.sha1()
+	with open(path, 'rb') as f:
+		while True:
+			block = f.read(block_size)
+			if not block:
+				break
+			sha.update(block)
+	return sha.hexdigest()
+
+
+def _extract(path, directory):
+	"""Parse a bank file and write each column of its sngl_inspiral table to
+	directory."""
+	from glue.ligolw import utils, lsctables, types
+	xmldoc = utils.load_filename(path, gz=path.endswith('.gz'))
+	table = lsctables.table.get_table(xmldoc, lsctables.SnglInspiralTable.tableName)
+	tmp_directory = '%s.%d.tmp' % (directory, os.getpid())
+	os.makedirs(tmp_directory)
+	for name, columntype in zip(table.columnnames, table.columntypes):
+		values = table.get_column(name)
+		dtype = types.ToNumPyType.get(columntype)
+		# Columns without a NumPy equivalent, such as ilwd:char IDs, are
+		# stored as strings.
+		column = numpy.asarray(values, dtype=dtype) if dtype else numpy.asarray(
+			[str(value) for value in values], dtype=str)
+		numpy.save(os.path.join(tmp_directory, name + '.npy'), column)
+	# Rename the whole directory at once so that readers never see a partial
+	# cache; if another process got there first, use its copy.
+	try:
+		os.rename(tmp_directory, directory)
+	except OSError:
+		for name in os.listdir(tmp_directory):
+			os.remove(os.path.join(tmp_directory, name))
+		os.rmdir(tmp_directory)
+
+
+def load_columns(path, columns, cache_dir=default_cache_dir):
+	"""Read the named columns of the sngl_inspiral table in the bank file at
+	path (.xml or .xml.gz), as a tuple of read-only, memory-mapped arrays.
+	Raises ValueError if the table has no such column."""
+	directory = os.path.join(cache_dir, file_hash(path))
+	if not os.path.isdir(directory):
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		with stage('parse_xml'):
+			_extract(path, directory)
+	result = []
+	for name in columns:
+		try:
+			result.append(numpy.load(os.path.join(directory, name + '.npy'), mmap_mode='r'))
+		except (IOError, OSError):
+			raise ValueError('%s has no sngl_inspiral column %r' % (path, name))
+	return tuple(result)
@@ -0,0 +1,100 @@
+"""
+Set operations and range queries on template banks, vectorized so that they
+scale to banks of 10^5 to 10^6 templates.
+
+A bank is represented by a tuple of equal-length columns, such as the
+'mchirp' and 'mtotal' columns of a SnglInspiralTable. Set operations compare
+whole rows for exact equality by sorting them; BankIndex answers rectangle
+and chirp-mass band queries in the plane of two columns with a sorted grid.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('in_rows', 'setdiff_rows', 'intersect_rows', 'BankIndex')
+
+import numpy
+
+
+def _row_keys(columns):
+	"""One opaque, sortable key per row of a tuple of columns, equal exactly
+	when the rows are equal as floats."""
+	# Adding zero maps -0.0 to 0.0, which compare equal but differ in bits.
+	rows = numpy.ascontiguousarray(
+		numpy.column_stack([numpy.asarray(column, dtype=float) + 0. for column in columns]))
+	return rows.view(numpy.dtype((numpy.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+
+
+def in_rows(a, b):
+	"""Boolean mask of the rows of the columns a that also occur in the
+	columns b."""
+	a = _row_keys(a)
+	b = numpy.sort(_row_keys(b))
+	if not len(b):
+		return numpy.zeros(len(a), dtype=bool)
+	i = numpy.minimum(numpy.searchsorted(b, a), len(b) - 1)
+	return b[i] == a
+
+
+def setdiff_rows(a, b):
+	"""Rows of the columns a that do not occur in b, in their original order,
+	as a tuple of columns. Duplicates in a are kept."""
+	mask = ~in_rows(a, b)
+	return tuple(numpy.asarray(column)[mask] for column in a)
+
+
+def intersect_rows(a, b):
+	"""Rows of the columns a that also occur in b, in their original order,
+	as a tuple of columns. Duplicates in a are kept."""
+	mask = in_rows(a, b)
+	return tuple(numpy.asarray(column)[mask] for column in a)
+
+
+class BankIndex(object):
+	"""Sorted grid over two columns x and y (by default, chirp mass and total
+	mass). Templates are binned by x into num_cells strips of equal width and
+	sorted by y within each strip. Queries return indices into the original
+	columns, in ascending order."""
+
+	def __init__(self, x, y, num_cells=None):
+		self.x = numpy.asarray(x, dtype=float)
+		self.y = numpy.asarray(y, dtype=float)
+		if self.x.shape != self.y.shape:
+			raise ValueError('columns have different lengths')
+		n = len(self.x)
+		if num_cells is None:
+			num_cells = max(1, int(numpy.sqrt(n)))
+		self.x_min = self.x.min() if n else 0.
+		x_max = self.x.max() if n else 0.
+		self.cell_width = (x_max - self.x_min) / num_cells or 1.
+		self.num_cells = num_cells
+		cells = self._cell(self.x)
+		self.order = numpy.lexsort((self.y, cells))
+		self.sorted_y = self.y[self.order]
+		self.cell_starts = numpy.searchsorted(cells[self.order], numpy.arange(num_cells + 1))
+
+	def __len__(self):
+		return len(self.x)
+
+	def _cell(self, x):
+		cells = numpy.floor((numpy.asarray(x) - self.x_min) / self.cell_width).astype(int)
+		return numpy.clip(cells, 0, self.num_cells - 1)
+
+	def rectangle(self, x_min, x_max, y_min, y_max):
+		"""Indices of templates with x_min <= x <= x_max and
+		y_min <= y <= y_max."""
+		parts = []
+		for cell in range(self._cell(x_min), self._cell(x_max) + 1):
+			start, stop = self.cell_starts[cell], self.cell_starts[cell + 1]
+			y = self.sorted_y[start:stop]
+			lo = start + numpy.searchsorted(y, y_min, 'left')
+			hi = start + numpy.searchsorted(y, y_max, 'right')
+			parts.append(self.order[lo:hi])
+		if not parts:
+			return numpy.zeros(0, dtype=int)
+		indices = numpy.concatenate(parts)
+		# Only the strips at the ends can hold templates outside [x_min, x_max]
+		x = self.x[indices]
+		return numpy.sort(indices[(x >= x_min) & (x <= x_max)])
+
+	def band(self, x_min, x_max):
+		"""Indices of templates with x_min <= x <= x_max, such as a band in
+		chirp mass."""
+		return self.rectangle(x_min, x_max, -numpy.inf, numpy.inf)
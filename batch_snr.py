@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+Percent accumulated SNR and horizon distance for many measured noise spectra.
+
+The spectra are two-column text files of frequency and ASD or PSD, such as
+the *-TMPLTBANK-*.strainspec.txt files written for each analysis segment.
+Each argument is a file, a directory, in which the files that match
+--pattern are taken, or a glob. Whether a file stores a PSD or an ASD is
+guessed from its values by noisemodels.stores_psd.
+
+For each spectrum the table gives the percentage of the SNR above f_ref that
+is accumulated above each low frequency cutoff, and the horizon distance
+in Mpc for that cutoff, as in plot_accum_snr.py. The spectra are processed
+by a pool of worker processes, and each row is written as soon as its
+spectrum is done, so the rows are not in the order of the arguments.
+Spectra that cannot be read, or that have frequencies or spectral densities
+that are not positive and finite, are reported on stderr without stopping
+the others, and the script then exits with status 1.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('SpectrumResult', 'find_spectra', 'process_spectrum', 'process_spectra')
+
+from collections import namedtuple
+from functools import partial
+import glob
+import os.path
+import numpy
+from noisemodels import stores_psd
+from snr import snr_sweep
+
+default_pattern = '*-TMPLTBANK-*.strainspec*.txt'
+
+
+SpectrumResult = namedtuple('SpectrumResult', 'path is_psd fractional_snr horizon error')
+SpectrumResult.__doc__ = """Result of process_spectrum for one spectrum, with
+L low frequency cutoffs.
+
+path: path of the spectrum
+is_psd: whether the file stores a PSD rather than an ASD
+fractional_snr: (L,) SNR above each low frequency cutoff, as a fraction of
+	the SNR above f_ref
+horizon: (L,) horizon distance in Mpc for each low frequency cutoff
+error: if the spectrum could not be read or is not valid, the reason,
+	and the other fields are None"""
+
+
+def find_spectra(args, pattern=default_pattern):
+	"""Sorted paths of the spectra named by args, each a file, a directory
+	in which the files matching pattern are taken, or a glob."""
+	paths = set()
+	for arg in args:
+		if os.path.isdir(arg):
+			paths.update(glob.glob(os.path.join(arg, pattern)))
+		elif os.path.exists(arg):
+			paths.add(arg)
+		else:
+			matches = glob.glob(arg)
+			if not matches:
+				raise ValueError('no spectra match %r' % arg)
+			paths.update(path for path in matches if not os.path.isdir(path))
+	return sorted(paths)
+
+
+def _load_spectrum(path, is_psd):
+	"""(N, 2) array of frequency and ASD read from the text file at path.
+	Corpus files are read once each, so unlike noisemodels.load_asd this
+	does not keep a binary copy in the cache."""
+	data = numpy.loadtxt(path)
+	if data.ndim != 2 or data.shape[1] != 2 or len(data) < 2:
+		raise ValueError('not a two-column spectrum of at least two rows')
+	if not numpy.all(numpy.isfinite(data) & (data > 0)):
+		raise ValueError('frequencies or spectral densities are not all positive and finite')
+	if not numpy.all(numpy.diff(data[:, 0]) > 0):
+		raise ValueError('frequencies are not increasing')
+	if is_psd:
+		data[:, 1] = numpy.sqrt(data[:, 1])
+	return data
+
+
+def process_spectrum(path, m1=1.4, m2=1.4, f_lows=(40., 30., 20., 10.),
+		f_ref=10., snr_threshold=8.):
+	"""Fractional SNR and horizon distance for the spectrum at path, for a
+	binary of component masses m1 and m2 in M_sun. Returns a SpectrumResult."""
+	try:
+		is_psd = stores_psd(path)
+		data = _load_spectrum(path, is_psd)
+		sweep = snr_sweep([data], m1, m2, f_lows, f_ref, snr_threshold, curves=False)
+	except (IOError, OSError, ValueError) as e:
+		return SpectrumResult(path, None, None, None, str(e))
+	return SpectrumResult(path, is_psd, sweep.fractional_snr[0, 0], sweep.horizon[0, 0], None)
+
+
+def process_spectra(paths, m1=1.4, m2=1.4, f_lows=(40., 30., 20., 10.),
+		f_ref=10., snr_threshold=8., processes=None, chunksize=4):
+	"""Generate a SpectrumResult for each of the spectra at paths, as in
+	process_spectrum. If processes is given, the spectra are divided among
+	that many worker processes in chunks of chunksize, and the results are
+	generated in the order in which they are done."""
+	func = partial(process_spectrum, m1=m1, m2=m2, f_lows=tuple(f_lows),
+		f_ref=f_ref, snr_threshold=snr_threshold)
+	if not processes:
+		for path in paths:
+			yield func(path)
+		return
+	from multiprocessing import Pool
+	pool = Pool(processes)
+	try:
+		for result in pool.imap_unordered(func, paths, chunksize=chunksize):
+			yield result
+	finally:
+		pool.close()
+		pool.join()
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	import sys
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options] SPECTRUM|DIRECTORY|GLOB ...', option_list = [
+		Option("--pattern", default=default_pattern,
+			help="pattern of the spectra in directories (default: %default)"),
+		Option("--flow", type="float", action="append", metavar="Hz",
+			help="low frequency cutoff; may be repeated (default: 40, 30, 20 and 10)"),
+		Option("--fref", type="float", default=10., metavar="Hz",
+			help="low frequency cutoff of the reference SNR (default: %default)"),
+		Option("--mass1", type="float", default=1.4, metavar="solar masses",
+			help="component mass 1 (default: %default)"),
+		Option("--mass2", type="float", default=1.4, metavar="solar masses",
+			help="component mass 2 (default: %default)"),
+		Option("--threshold", type="float", default=8.,
+			help="SNR at which the horizon distance is defined (default: %default)"),
+		Option("--processes", "-j", type="int", default=None,
+			help="number of worker processes (default: run serially)"),
+		Option("--output", "-o", metavar="FILE",
+			help="write the table to FILE (default: stdout)"),
+	]).parse_args()
+	if len(args) == 0:
+		raise ValueError("No spectra given")
+
+	f_lows = opts.flow or [40., 30., 20., 10.]
+	paths = find_spectra(args, opts.pattern)
+	out = open(opts.output, 'w') if opts.output else sys.stdout
+	out.write('\t'.join(['# path', 'kind'] +
+		['snr_percent_%g_Hz' % f_low for f_low in f_lows] +
+		['horizon_Mpc_%g_Hz' % f_low for f_low in f_lows]) + '\n')
+	failed = 0
+	for result in process_spectra(paths, opts.mass1, opts.mass2, f_lows,
+			opts.fref, opts.threshold, opts.processes):
+		if result.error:
+			failed += 1
+			sys.stderr.write('%s: %s\n' % (result.path, result.error))
+			continue
+		out.write('\t'.join([result.path, 'PSD' if result.is_psd else 'ASD'] +
+			['%.1f' % (100 * frac_snr) for frac_snr in result.fractional_snr] +
+			['%.1f' % D for D in result.horizon]) + '\n')
+		out.flush()
+	if out is not sys.stdout:
+		out.close()
+	sys.stderr.write('%d of %d spectra processed\n' % (len(paths) - failed, len(paths)))
+	if failed:
+		sys.exit(1)
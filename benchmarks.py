@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Benchmark the numerical kernels behind the figures and tables, at several
+problem sizes, and compare the timings with a stored baseline.
+
+Each benchmark is run repeatedly at each size; the best wall-clock time, the
+peak memory allocated during one run (as traced by tracemalloc, where it is
+available), and the throughput in the benchmark's own units are written to
+a JSON results file. If a baseline file exists, every timing that is slower
+than its baseline by more than the tolerance is reported as a regression,
+and the script exits with status 1. Pass --save-baseline to make the current
+results the new baseline.
+
+Timings depend on the machine, so baselines are kept out of version control
+in data/benchmarks.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('Benchmark', 'benchmarks', 'measure', 'run', 'compare')
+
+from collections import namedtuple
+import json
+import os
+import os.path
+import platform
+import time
+import numpy
+
+basedir = os.path.dirname(os.path.abspath(__file__))
+default_output = os.path.join(basedir, 'data', 'benchmarks', 'results.json')
+default_baseline = os.path.join(basedir, 'data', 'benchmarks', 'baseline.json')
+
+
+Benchmark = namedtuple('Benchmark', 'name setup sizes unit')
+Benchmark.__doc__ = """A kernel to benchmark.
+
+name: unique name
+setup: function of one problem size that prepares the inputs and returns
+	a function of no arguments that runs the kernel once, and the number of
+	units of work that it does
+sizes: problem sizes
+unit: name of the unit of work, for throughput"""
+
+
+def _power_law_moments(num_points):
+	# Cumulative moments of localization_uncertainty.py on a grid of
+	# num_points frequencies
+	from noisemodels import asds
+	from snr import power_law_moments
+	f, asd = asds['zero det., high power'].T
+	f_out = numpy.logspace(numpy.log10(2.), numpy.log10(1570.), num_points)
+	return lambda: power_law_moments(f, asd, (-7./3, -4./3, -1./3), 2., 1570., f_out), num_points
+
+
+def _snr_sweep(num_psds):
+	# Accumulated SNR of plot_accum_snr.py for num_psds noise models, reusing
+	# the stored ones in turn
+	from noisemodels import asds
+	from snr import snr_sweep
+	models = list(asds.values())
+	psds = [numpy.asarray(models[i % len(models)]) for i in range(num_psds)]
+	return lambda: snr_sweep(psds, 1.4, 1.4, [40, 30, 20, 10]), sum(len(psd) for psd in psds)
+
+
+def _mock_noise(seconds):
+	# Filter bank of mock_psd.py, in one-second blocks
+	from mock_noise import NoiseGenerator, rate
+	def func():
+		noise = NoiseGenerator(rate, settle=0, random_state=0)
+		for i in range(seconds):
+			noise.next_block()
+	return func, seconds * rate
+
+
+def _bank_setdiff(num_templates):
+	# Deduplication of plot_bank.py: a bank against a tenth of itself
+	from bankindex import setdiff_rows
+	random = numpy.random.RandomState(0)
+	big = (random.uniform(0.8, 2.7, num_templates), random.uniform(2., 6., num_templates))
+	small = tuple(column[::10] for column in big)
+	return lambda: setdiff_rows(big, small), num_templates
+
+
+def _plan_time_slices(num_candidates):
+	# Time slice placement and operation counts of time_slices.py
+	from slice_planner import plan_time_slices
+	return lambda: plan_time_slices(1.4, 1.4, 40., 1570., num_candidates=num_candidates), num_candidates
+
+
+benchmarks = (
+	Benchmark('power_law_moments', _power_law_moments, (1000, 10000, 100000), 'grid points'),
+	Benchmark('snr_sweep', _snr_sweep, (1, 8, 64), 'PSD samples'),
+	Benchmark('mock_noise', _mock_noise, (1, 10, 60), 'samples'),
+	Benchmark('bank_setdiff', _bank_setdiff, (10000, 100000, 1000000), 'templates'),
+	Benchmark('plan_time_slices', _plan_time_slices, (16, 64, 256), 'candidates'),
+)
+
+
+def measure(func, repeat=3):
+	"""Best wall-clock time in seconds of repeat calls of func, after one
+	untimed call to warm up caches, and the peak memory in bytes allocated
+	during one more call, or None if tracemalloc is not available."""
+	func()
+	times = []
+	for i in range(repeat):
+		start = time.time()
+		func()
+		times.append(time.time() - start)
+	try:
+		import tracemalloc
+	except ImportError:
+		peak = None
+	else:
+		tracemalloc.start()
+		try:
+			func()
+			peak = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+	return min(times), peak
+
+
+def run(names=None, repeat=3, largest=None, progress=None):
+	"""Run the benchmarks (all of them, or those named in names) at each of
+	their sizes, or only the first largest sizes, and return a list of
+	result records."""
+	results = []
+	for benchmark in benchmarks:
+		if names and benchmark.name not in names:
+			continue
+		for size in benchmark.sizes[:largest]:
+			func, work = benchmark.setup(size)
+			seconds, peak = measure(func, repeat)
+			result = {'name': benchmark.name, 'size': size, 'seconds': seconds,
+				'peak_bytes': peak, 'throughput': work / seconds if seconds else None,
+				'unit': benchmark.unit + ' per second'}
+			results.append(result)
+			if progress is not None:
+				progress.write('%-18s %8d  %10.4f s  %12s  %12.4g %s\n' % (
+					result['name'], size, seconds,
+					'-' if peak is None else '%.1f MiB' % (peak / 1048576.),
+					result['throughput'] or float('nan'), result['unit']))
+	return results
+
+
+def compare(results, baseline, tolerance=0.25):
+	"""Results that are slower than their baseline by more than the fraction
+	tolerance, as (result, baseline seconds) pairs."""
+	reference = dict(((record['name'], record['size']), record['seconds']) for record in baseline)
+	regressions = []
+	for result in results:
+		seconds = reference.get((result['name'], result['size']))
+		if seconds and result['seconds'] > (1 + tolerance) * seconds:
+			regressions.append((result, seconds))
+	return regressions
+
+
+def _write(path, results):
+	directory = os.path.dirname(path)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+	with open(path, 'w') as f:
+		json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'python': platform.python_version(), 'numpy': numpy.__version__,
+			'machine': platform.platform(), 'results': results}, f, indent=1)
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	import sys
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options] [BENCHMARK ...]', option_list = [
+		Option("--output", default=default_output, metavar="FILE",
+			help="results file (default: %default)"),
+		Option("--baseline", default=default_baseline, metavar="FILE",
+			help="baseline results file (default: %default)"),
+		Option("--save-baseline", action="store_true", default=False,
+			help="save the results as the new baseline"),
+		Option("--tolerance", type="float", default=0.25,
+			help="fractional slowdown reported as a regression (default: %default)"),
+		Option("--repeat", type="int", default=3,
+			help="timed runs per benchmark and size (default: %default)"),
+		Option("--quick", action="store_true", default=False,
+			help="run only the smallest size of each benchmark"),
+	]).parse_args()
+	unknown = set(args) - set(benchmark.name for benchmark in benchmarks)
+	if unknown:
+		raise ValueError("Unknown benchmarks: %s" % ', '.join(sorted(unknown)))
+
+	results = run(args, opts.repeat, 1 if opts.quick else None, sys.stdout)
+	_write(opts.output, results)
+	if opts.save_baseline:
+		_write(opts.baseline, results)
+	elif os.path.exists(opts.baseline):
+		with open(opts.baseline) as f:
+			regressions = compare(results, json.load(f)['results'], opts.tolerance)
+		for result, seconds in regressions:
+			sys.stdout.write('REGRESSION: %s at size %d took %.4f s, baseline %.4f s\n' % (
+				result['name'], result['size'], result['seconds'], seconds))
+		if regressions:
+			sys.exit(1)
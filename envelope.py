@@ -1,28 +1,33 @@
 #!/usr/bin/env python
 
+from stages import stage, report
 from optparse import OptionParser, Option
-from pylal import spawaveform
 import numpy as np
-import matplotlib
 from operator import attrgetter
-import pylab
 from itertools import groupby, izip
 import sys
+from inspiral import chirp_mass
+from plotutil import headless
+with stage('import'):
+	headless()
+	import matplotlib
+	import pylab
 
 # Command line interface
 
 # Place time slices
 
 # Generate plot
-from gstlal.svd_bank import read_banks
-bank, = read_banks('data/svd_0_9.xml')
+with stage('load'):
+	from gstlal.svd_bank import read_banks
+	bank, = read_banks('data/svd_0_9.xml')
 pylab.figure(figsize=(3.5,2.5))
 ax = pylab.subplot(111)
 legend_artists = []
 legend_labels = []
 num_rates = len(set(x.rate for x in bank.bank_fragments))
 tmax = max(x.end for x in bank.bank_fragments)
-mc = spawaveform.chirpmass(1.4, 1.4)
+mc = chirp_mass(1.4, 1.4)
 for color, (rate, fragments) in izip(pylab.linspace(0.25, 1., num_rates), groupby(bank.bank_fragments, attrgetter('rate'))):
 	legend_artists += [pylab.Rectangle((0, 0), 1, 1, facecolor = str(color))]
 	legend_labels += ['%d Hz' % rate]
@@ -39,4 +44,6 @@ pylab.grid()
 pylab.xlabel('time relative to coalescence (s)')
 pylab.ylabel(r'strain amplitude')
 pylab.subplots_adjust(left=0.075, right=0.9, top=0.95, bottom=0.225)
-pylab.savefig(sys.argv[1])
+with stage('savefig'):
+	pylab.savefig(sys.argv[1])
+report(sys.argv[1])
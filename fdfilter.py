@@ -0,0 +1,116 @@
+"""
+Overlap-save frequency domain (FD) filtering of a whole template bank, with
+the FFT block length chosen to minimize the cost of Equation (fd-flops) of
+the paper subject to a latency budget.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('fd_cost', 'fd_latency', 'optimal_block_length', 'OverlapSaveFilter')
+
+import time
+import numpy
+
+
+def fd_cost(num_templates, template_length, block_length):
+	"""Floating point operations per input sample of overlap-save filtering
+	of num_templates templates of template_length samples with FFT blocks of
+	block_length samples (the paper's Equation (fd-flops) divided by f^0)."""
+	M = num_templates
+	N = template_length
+	D = numpy.asarray(block_length, dtype=float)
+	return (2 * (M + 1) * numpy.log2(D) + 2 * M) / (1 - N / D)
+
+
+def fd_latency(template_length, block_length):
+	"""Latency in samples of overlap-save filtering: a block can be
+	transformed only once it has block_length - template_length new samples."""
+	return block_length - template_length
+
+
+def _smooth_numbers(lo, hi):
+	"""Ascending integers in (lo, hi] with no prime factors other than 2, 3
+	and 5, the sizes for which FFTs are fast."""
+	out = []
+	p2 = 1
+	while p2 <= hi:
+		p3 = p2
+		while p3 <= hi:
+			p5 = p3
+			while p5 <= hi:
+				if p5 > lo:
+					out.append(p5)
+				p5 *= 5
+			p3 *= 3
+		p2 *= 2
+	return sorted(out)
+
+
+def optimal_block_length(num_templates, template_length, max_latency=None, max_block_length=1 << 30):
+	"""FFT block length, with no prime factors other than 2, 3 and 5, that
+	minimizes fd_cost subject to a latency of at most max_latency samples.
+	Raises ValueError if no block length satisfies the latency budget."""
+	hi = max_block_length
+	if max_latency is not None:
+		hi = min(hi, template_length + max_latency)
+	candidates = _smooth_numbers(template_length, hi)
+	if not candidates:
+		raise ValueError('no FFT block length gives a latency of at most %d samples for %d-sample templates' % (max_latency, template_length))
+	costs = fd_cost(num_templates, template_length, candidates)
+	return candidates[int(numpy.argmin(costs))]
+
+
+class OverlapSaveFilter(object):
+	"""Streaming overlap-save filter for a bank of FIR templates.
+
+	templates: (M, N) array of filter coefficients
+	rate: sample rate in Hz
+	block_length: FFT block length; by default, the one chosen by
+		optimal_block_length for max_latency
+	max_latency: latency budget in seconds
+
+	The template transforms are computed once, and each block of data is
+	filtered by all templates with one forward transform and one batched 2-D
+	inverse transform. Calling the filter with a block of strain returns an
+	(M, n) array of the outputs that have become available, where n may be
+	zero; concatenated, they equal the causal convolution of the input with
+	each template. samples_per_second reports the measured throughput."""
+
+	def __init__(self, templates, rate, block_length=None, max_latency=None):
+		templates = numpy.asarray(templates, dtype=float)
+		self.num_templates, self.template_length = templates.shape
+		self.rate = rate
+		if block_length is None:
+			block_length = optimal_block_length(self.num_templates, self.template_length,
+				None if max_latency is None else int(numpy.floor(max_latency * rate)))
+		elif block_length <= self.template_length:
+			raise ValueError('block length must exceed the template length')
+		self.block_length = int(block_length)
+		self.latency = fd_latency(self.template_length, self.block_length) / float(rate)
+		self.cost = fd_cost(self.num_templates, self.template_length, self.block_length) * rate
+
+		self._transforms = numpy.fft.rfft(templates, self.block_length, axis=1)
+		# Each block holds N - 1 old samples and D - N + 1 new ones.
+		self._buf = numpy.zeros(self.template_length - 1)
+		self.samples = 0
+		self.elapsed = 0.
+
+	@property
+	def samples_per_second(self):
+		"""Input samples processed per second of wall-clock time so far."""
+		return self.samples / self.elapsed if self.elapsed else float('nan')
+
+	def __call__(self, x):
+		start = time.time()
+		D = self.block_length
+		step = D - self.template_length + 1
+		self._buf = numpy.concatenate((self._buf, numpy.asarray(x, dtype=float)))
+		num_blocks = (len(self._buf) - D) // step + 1 if len(self._buf) >= D else 0
+		out = numpy.empty((self.num_templates, num_blocks * step))
+		for i in range(num_blocks):
+			block = self._buf[i * step:i * step + D]
+			y = numpy.fft.irfft(numpy.fft.rfft(block) * self._transforms, D, axis=1)
+			# The first N - 1 outputs of each block are circularly aliased.
+			out[:, i * step:(i + 1) * step] = y[:, self.template_length - 1:]
+		self._buf = self._buf[num_blocks * step:]
+		self.samples += len(x)
+		self.elapsed += time.time() - start
+		return out
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Check that the computational modules import quickly and without the
+plotting stack.
+
+Each module is imported in a fresh interpreter, after NumPy, which all of
+them need. The import must take no longer than the budget, and must not
+import matplotlib, SciPy or the LIGO libraries: scripts that only print a
+table or compute in batch should not pay for them. The script exits with
+status 1 if any module is over budget or imports any of those.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('modules', 'heavy_modules', 'import_time')
+
+import json
+import os.path
+import subprocess
+import sys
+
+basedir = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that must start fast. mock_noise, lloid and svdbank are left out
+# because they are built on scipy.signal.
+modules = ('inspiral', 'snr', 'precision', 'noisemodels', 'memo', 'stages',
+	'plotutil', 'skyloc', 'alert_times', 'slice_planner', 'bankindex',
+	'bankcache', 'subbanks', 'matchstore', 'matchstats', 'benchmarks',
+	'batch_snr')
+
+heavy_modules = ('matplotlib', 'pylab', 'scipy', 'glue', 'pylal', 'gstlal')
+
+_probe = """
+import json, sys, time
+import numpy
+start = time.time()
+import %s
+seconds = time.time() - start
+heavy = sorted(set(name.split('.')[0] for name in sys.modules) & set(%r))
+sys.stdout.write(json.dumps({'seconds': seconds, 'heavy': heavy}))
+"""
+
+
+def import_time(module, repeat=3):
+	"""Best time in seconds to import module in a fresh interpreter, after
+	NumPy, and the heavy modules that it imports. Raises ImportError with
+	the last line of the interpreter's error output if the import fails."""
+	best = None
+	for i in range(repeat):
+		process = subprocess.Popen([sys.executable, '-c', _probe % (module, heavy_modules)],
+			cwd=basedir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		output, error = process.communicate()
+		if process.returncode:
+			lines = error.decode('utf-8').strip().splitlines()
+			raise ImportError(lines[-1] if lines else 'exit status %d' % process.returncode)
+		result = json.loads(output.decode('utf-8'))
+		if best is None or result['seconds'] < best:
+			best = result['seconds']
+	return best, result['heavy']
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options] [MODULE ...]', option_list = [
+		Option("--budget", type="float", default=0.05, metavar="seconds",
+			help="longest allowed import time (default: %default)"),
+		Option("--repeat", type="int", default=3,
+			help="imports timed per module (default: %default)"),
+	]).parse_args()
+
+	failed = False
+	for module in args or modules:
+		try:
+			seconds, heavy = import_time(module, opts.repeat)
+		except ImportError as e:
+			seconds, problems = float('nan'), ['fails to import: %s' % e]
+		else:
+			problems = []
+			if seconds > opts.budget:
+				problems.append('over budget')
+			if heavy:
+				problems.append('imports ' + ', '.join(heavy))
+		failed = failed or bool(problems)
+		sys.stdout.write('%-16s %8.1f ms  %s\n' % (module, 1e3 * seconds,
+			'; '.join(problems) or 'ok'))
+	if failed:
+		sys.exit(1)
@@ -0,0 +1,154 @@
+"""
+Physical constants and basic relations for compact binary inspirals.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('LAL_C', 'LAL_PI', 'LAL_MTSUN_SI', 'LAL_PC_SI',
+	'chirp_mass', 'isco_frequency', 'horizon', 'freq_to_time', 'time_to_freq',
+	'pn_orders', 'chirp_time', 'chirp_frequency', 'ChirpTable', 'chirp_table')
+
+import numpy
+
+# Some constants
+LAL_C = 299792458.
+LAL_PI = 3.1415926535897932384626433832795029
+LAL_MTSUN_SI = 4.9254909500000001e-06
+LAL_PC_SI = 3.0856775807e16
+
+
+def chirp_mass(m1, m2):
+	"""Chirp mass in M_sun of component masses m1 and m2 in M_sun."""
+	m1 = numpy.asarray(m1, dtype=float)
+	m2 = numpy.asarray(m2, dtype=float)
+	return (m1 * m2)**.6 / (m1+m2)**.2
+
+
+def isco_frequency(m1, m2):
+	"""ISCO frequency in Hz (equation 3.6, FINDCHIRP paper)."""
+	return 4400. / (numpy.asarray(m1, dtype=float) + numpy.asarray(m2, dtype=float))
+
+
+def horizon(Mc, hdoth, snr=8.):
+	r"""Horizon distance in Mpc of an optimally oriented binary of chirp mass Mc
+	in M_sun, detected at the given SNR, where hdoth is the noise-weighted
+	inner product 4 \int f^(-7/3) / S(f) df."""
+	Mc = numpy.asarray(Mc, dtype=float) * LAL_MTSUN_SI
+	D = 2. * LAL_C * (5./96.)**.5 * Mc**(5./6.) * LAL_PI**(-2./3.) * numpy.sqrt(hdoth) / snr
+	return D / 1e6 / LAL_PC_SI
+
+
+def freq_to_time(Mc, f):
+	"""Time in seconds before coalescence at which a binary of chirp mass Mc
+	in M_sun reaches gravitational wave frequency f, to Newtonian order."""
+	Mc = numpy.asarray(Mc, dtype=float) * LAL_MTSUN_SI
+	return 5. * Mc / 256. * (LAL_PI * Mc * numpy.asarray(f, dtype=float)) ** (-8./3.)
+
+
+def time_to_freq(Mc, t):
+	"""Inverse of freq_to_time."""
+	Mc = numpy.asarray(Mc, dtype=float) * LAL_MTSUN_SI
+	return (256. * numpy.asarray(t, dtype=float) / (5. * Mc)) ** (-3./8.) / (LAL_PI * Mc)
+
+
+# Post-Newtonian time-frequency relation (TaylorT2, e.g. equation 3.4 of the
+# FINDCHIRP paper, without its 3PN and 3.5PN terms). The order is twice the
+# PN order, as in LAL: 0 (Newtonian), 2 (1PN), 3 (1.5PN) or 4 (2PN).
+
+pn_orders = (0, 2, 3, 4)
+
+
+def _chirp_time_coefficients(eta, order):
+	"""Coefficients of the polynomial in v, of degree order, that multiplies
+	the Newtonian chirp time. eta may be an array."""
+	if order not in pn_orders:
+		raise ValueError('PN order must be one of %s' % (pn_orders,))
+	coefficients = [numpy.ones_like(eta), numpy.zeros_like(eta),
+		743./252 + 11./3 * eta,
+		-32. / 5 * LAL_PI * numpy.ones_like(eta),
+		3058673./508032 + 5429./504 * eta + 617./72 * eta**2]
+	return coefficients[:order + 1]
+
+
+def _chirp_time_v(M, eta, v, order):
+	"""Chirp time and its derivative with respect to v = (pi M f)^(1/3), for
+	total mass M in seconds."""
+	coefficients = _chirp_time_coefficients(eta, order)
+	P = sum(c * v**k for k, c in enumerate(coefficients))
+	dP = sum(k * c * v**(k - 1) for k, c in enumerate(coefficients) if k)
+	newtonian = 5. / 256 * M / eta * v**-8
+	return newtonian * P, newtonian * (dP - 8 * P / v)
+
+
+def _masses(m1, m2):
+	m1 = numpy.asarray(m1, dtype=float)
+	m2 = numpy.asarray(m2, dtype=float)
+	M = m1 + m2
+	return M * LAL_MTSUN_SI, m1 * m2 / M**2
+
+
+def chirp_time(m1, m2, f, order=0):
+	"""Time in seconds before coalescence at which a binary of component
+	masses m1 and m2 in M_sun reaches gravitational wave frequency f in Hz,
+	at the given PN order. All arguments are broadcast against each other.
+	At order 0 this is freq_to_time."""
+	M, eta = _masses(m1, m2)
+	v = (LAL_PI * M * numpy.asarray(f, dtype=float)) ** (1./3)
+	return _chirp_time_v(M, eta, v, order)[0]
+
+
+def chirp_frequency(m1, m2, t, order=0, iterations=20, tolerance=1e-12):
+	"""Inverse of chirp_time: gravitational wave frequency in Hz reached t
+	seconds before coalescence. Beyond order 0 this is found by Newton's
+	method, for all elements at once, starting from the Newtonian value."""
+	M, eta = _masses(m1, m2)
+	t = numpy.asarray(t, dtype=float)
+	M, eta, t = numpy.broadcast_arrays(M, eta, t)
+	v = (256. / 5 * eta * t / M) ** (-1./8)
+	if order:
+		# Higher order terms can turn the chirp time around at large v, so
+		# stay below the ISCO frequency of isco_frequency.
+		v_max = (LAL_PI * 4400. * LAL_MTSUN_SI) ** (1./3)
+		v = numpy.minimum(v, v_max)
+		for i in range(iterations):
+			value, derivative = _chirp_time_v(M, eta, v, order)
+			step = (value - t) / derivative
+			v = numpy.clip(v - step, 0.5 * v, v_max)
+			if numpy.all(numpy.abs(step) <= tolerance * v):
+				break
+	return v**3 / (LAL_PI * M)
+
+
+class ChirpTable(object):
+	"""Chirp time of one binary tabulated on a log-spaced frequency grid from
+	f_low to f_high, for fast evaluation of chirp_time and chirp_frequency
+	by log-log interpolation. Obtain instances from chirp_table."""
+
+	def __init__(self, m1, m2, order, f_low, f_high, num_points=1024):
+		self.f = numpy.logspace(numpy.log10(f_low), numpy.log10(f_high), num_points)
+		self.t = chirp_time(m1, m2, self.f, order)
+		self._log_f = numpy.log(self.f)
+		self._log_t = numpy.log(self.t)
+
+	def time(self, f):
+		"""Interpolated chirp_time at frequencies f in [f_low, f_high]."""
+		return numpy.exp(numpy.interp(numpy.log(f), self._log_f, self._log_t))
+
+	def frequency(self, t):
+		"""Interpolated chirp_frequency at times t in [t(f_high), t(f_low)]."""
+		# Reversed, so that time increases for numpy.interp
+		return numpy.exp(numpy.interp(numpy.log(t), self._log_t[::-1], self._log_f[::-1]))
+
+
+_chirp_tables = {}
+
+
+def chirp_table(m1, m2, order=0, f_low=1., f_high=None):
+	"""Cached ChirpTable for scalar masses m1 and m2 in M_sun, by default from
+	1 Hz to the ISCO frequency."""
+	if f_high is None:
+		f_high = float(isco_frequency(m1, m2))
+	key = (float(m1), float(m2), order, float(f_low), float(f_high))
+	try:
+		return _chirp_tables[key]
+	except KeyError:
+		table = _chirp_tables[key] = ChirpTable(m1, m2, order, f_low, f_high)
+		return table
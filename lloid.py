@@ -0,0 +1,257 @@
+"""
+Streaming NumPy implementation of the LLOID multirate filter bank.
+
+The input strain, sampled at the highest time slice rate, is repeatedly
+decimated by 2 to obtain every lower rate. Each time slice is filtered with
+its orthogonal basis filters at its own rate, and its partial SNRs are
+recovered with its reconstruction matrix. Starting from the lowest rate, the
+partial SNRs are interpolated by 2 and added to those of the next higher
+rate, until all of them are summed at the full rate.
+
+All stages keep their state between calls, so strain may be fed in blocks
+of any length and the concatenated output does not depend on how the input
+was divided. The resampling filters delay the lower-rate branches; each
+slice is delayed by just enough to line everything up again, taking
+advantage of the fact that early slices of a template have finished long
+before coalescence. The remaining delay of the whole bank is reported as
+LLOIDFilter.latency.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('resample_kernel', 'Decimator', 'Interpolator', 'LLOIDFilter',
+	'slice_templates', 'svd_basis', 'complex_snr', 'throughput')
+
+import time
+import numpy
+from scipy import signal
+
+
+def resample_kernel(length):
+	"""Windowed-sinc low-pass kernel for resampling by a factor of 2, with
+	unit DC gain. length - 1 must be a multiple of 4, so that the kernel's
+	delay is an integer number of samples at the lower rate."""
+	if length < 1 or (length - 1) % 4:
+		raise ValueError('resampling kernel length must be 1 more than a multiple of 4')
+	k = numpy.arange(length) - (length - 1) // 2
+	h = numpy.sinc(k / 2.) * numpy.kaiser(length, 5.)
+	return h / h.sum()
+
+
+class Decimator(object):
+	"""Stateful polyphase decimator: low-pass filter with kernel and keep
+	every factor-th sample. Only the retained outputs are computed. Operates
+	on the last axis; the leading dimensions must not change between calls."""
+
+	def __init__(self, factor, kernel):
+		self.factor = int(factor)
+		self.kernel = numpy.asarray(kernel, dtype=float)
+		self._history = None
+		# Offset of the next output sample from the start of the next block
+		self._phase = 0
+
+	def __call__(self, x):
+		x = numpy.asarray(x, dtype=float)
+		if self._history is None:
+			self._history = numpy.zeros(x.shape[:-1] + (len(self.kernel) - 1,))
+		buf = numpy.concatenate((self._history, x), axis=-1)
+		length = buf.shape[-1]
+		start = self._history.shape[-1] + self._phase
+		n = max(0, -(-(length - start) // self.factor))
+		y = numpy.zeros(x.shape[:-1] + (n,))
+		if n:
+			stop = start + self.factor * (n - 1) + 1
+			for k, h in enumerate(self.kernel):
+				y += h * buf[..., start - k:stop - k:self.factor]
+		self._phase = start + self.factor * n - length
+		self._history = buf[..., length - self._history.shape[-1]:]
+		return y
+
+
+class Interpolator(object):
+	"""Stateful polyphase interpolator: insert factor - 1 zeros after every
+	sample and low-pass filter with kernel, computing each output phase with
+	its own subfilter. The gain is scaled by factor. Operates on the last
+	axis; the leading dimensions must not change between calls."""
+
+	def __init__(self, factor, kernel):
+		self.factor = int(factor)
+		kernel = numpy.asarray(kernel, dtype=float) * self.factor
+		self._phases = [kernel[r::self.factor] for r in range(self.factor)]
+		self._history = None
+
+	def __call__(self, x):
+		x = numpy.asarray(x, dtype=float)
+		if self._history is None:
+			self._history = numpy.zeros(x.shape[:-1] +
+				(max(len(h) for h in self._phases) - 1,))
+		buf = numpy.concatenate((self._history, x), axis=-1)
+		offset = self._history.shape[-1]
+		n = x.shape[-1]
+		y = numpy.zeros(x.shape[:-1] + (self.factor * n,))
+		for r, phase in enumerate(self._phases):
+			yr = y[..., r::self.factor]
+			for j, h in enumerate(phase):
+				yr += h * buf[..., offset - j:offset - j + n]
+		self._history = buf[..., buf.shape[-1] - offset:]
+		return y
+
+
+class _Fifo(object):
+	"""Multichannel first-in, first-out sample queue, initially holding
+	delay samples of zeros."""
+
+	def __init__(self, channels, delay=0):
+		self._buf = numpy.zeros((channels, delay))
+
+	def push(self, x):
+		self._buf = numpy.concatenate((self._buf, x), axis=1)
+
+	def pop(self, n):
+		out, self._buf = self._buf[:, :n], self._buf[:, n:]
+		return out
+
+
+class _SliceFilter(object):
+	"""Orthogonal FIR filters of one time slice followed by its
+	reconstruction matrix, applied after a delay of delay samples."""
+
+	def __init__(self, basis, reconstruction, delay):
+		self.basis = numpy.asarray(basis, dtype=float)
+		self.reconstruction = numpy.asarray(reconstruction, dtype=float)
+		self.delay = int(delay)
+		self._history = numpy.zeros(self.delay + self.basis.shape[1] - 1)
+
+	def __call__(self, x):
+		if not len(x):
+			return numpy.zeros((len(self.reconstruction), 0))
+		buf = numpy.concatenate((self._history, x))
+		# Drop the newest self.delay samples; they are used by later blocks.
+		used = buf[:len(buf) - self.delay]
+		y = signal.fftconvolve(used[numpy.newaxis, :], self.basis, mode='valid', axes=1)
+		if len(self._history):
+			self._history = buf[len(buf) - len(self._history):]
+		return numpy.dot(self.reconstruction, y)
+
+
+class LLOIDFilter(object):
+	"""Streaming LLOID filter bank.
+
+	slices: time slice table with fields 'rate', 'begin' and 'end', as
+		returned by gstlal.templates.time_slices or
+		slice_planner.plan_time_slices; all rates must be powers of 2 times
+		the lowest one
+	bases: for each row of slices, a pair (basis, reconstruction): basis is an
+		(L, N) array of orthogonal filters, N = (end - begin) * rate, and
+		reconstruction is an (M, L) array mapping filter outputs to M
+		template outputs
+	resample_kernel_length: number of taps of the decimation and
+		interpolation kernels, at the higher of their two rates
+
+	Calling the filter with a block of strain sampled at self.rate returns
+	an (M, len(block)) array of template outputs, delayed by self.latency
+	seconds."""
+
+	def __init__(self, slices, bases, resample_kernel_length=65):
+		rates = numpy.array([int(row['rate']) for row in slices])
+		self.rate = rates.max()
+		num_levels = int(round(numpy.log2(self.rate / float(rates.min())))) + 1
+		level_rates = [self.rate >> i for i in range(num_levels)]
+		if any(rate not in level_rates or self.rate % rate for rate in rates):
+			raise ValueError('time slice rates must differ by powers of 2')
+		num_outputs = len(bases[0][1])
+
+		kernel = resample_kernel(resample_kernel_length)
+		# Delay of one decimation and one interpolation by 2, in samples at
+		# the higher rate
+		resample_delay = len(kernel) - 1
+
+		# Work up from the lowest rate, choosing each level's latency (in
+		# samples at that level's rate) so that no slice needs a negative
+		# delay and the interpolated lower levels can be delayed to match.
+		latencies = [None] * num_levels
+		lower_latency = None
+		for i in reversed(range(num_levels)):
+			candidates = [-int(round(row['begin'] * row['rate']))
+				for row in slices if row['rate'] == level_rates[i]]
+			if lower_latency is not None:
+				candidates.append(2 * lower_latency + resample_delay)
+			latencies[i] = lower_latency = max(candidates)
+		self.latency = latencies[0] / float(self.rate)
+
+		self._filters = [[] for i in range(num_levels)]
+		for row, (basis, reconstruction) in zip(slices, bases):
+			i = level_rates.index(int(row['rate']))
+			expected = int(round((row['end'] - row['begin']) * row['rate']))
+			if numpy.shape(basis)[1] != expected:
+				raise ValueError('basis for a %d Hz slice has %d taps; expected %d'
+					% (row['rate'], numpy.shape(basis)[1], expected))
+			delay = latencies[i] + int(round(row['begin'] * row['rate']))
+			self._filters[i].append(_SliceFilter(basis, reconstruction, delay))
+
+		self._decimators = [Decimator(2, kernel) for i in range(num_levels - 1)]
+		self._interpolators = [Interpolator(2, kernel) for i in range(num_levels - 1)]
+		self._fifos = [_Fifo(num_outputs, latencies[i] - 2 * latencies[i + 1] - resample_delay)
+			for i in range(num_levels - 1)]
+		self.num_outputs = num_outputs
+
+	def __call__(self, x):
+		streams = [numpy.asarray(x, dtype=float)]
+		for decimator in self._decimators:
+			streams.append(decimator(streams[-1]))
+
+		acc = None
+		for i in reversed(range(len(streams))):
+			z = numpy.zeros((self.num_outputs, len(streams[i])))
+			for filt in self._filters[i]:
+				z += filt(streams[i])
+			if acc is not None:
+				fifo = self._fifos[i]
+				fifo.push(self._interpolators[i](acc))
+				z += fifo.pop(len(streams[i]))
+			acc = z
+		return acc
+
+
+def slice_templates(templates, rate, slices):
+	"""Cut full-rate templates into time slices. templates is an (M, N)
+	array of filter coefficients sampled at rate, where column k holds the
+	template k / rate seconds before coalescence. Returns a list of (M, N_s)
+	arrays, subsampled to each slice's rate and scaled so that filtering at
+	the lower rate gives the same output as at the full rate. Each slice's
+	rate must exceed twice the highest frequency the template reaches in it."""
+	templates = numpy.asarray(templates, dtype=float)
+	out = []
+	for row in slices:
+		step = int(rate // row['rate'])
+		begin = int(round(row['begin'] * rate))
+		end = int(round(row['end'] * rate))
+		out.append(step * templates[:, begin:end:step])
+	return out
+
+
+def svd_basis(matrix, tolerance=0.99):
+	"""Orthogonal basis filters and reconstruction matrix for an (M, N)
+	array of time-sliced templates, keeping the fewest singular vectors that
+	account for the given fraction of the sum of squared singular values.
+	Returns the (L, N) basis and the (M, L) reconstruction matrix."""
+	u, s, vh = numpy.linalg.svd(matrix, full_matrices=False)
+	kept = numpy.cumsum(s**2) / numpy.sum(s**2)
+	n = int(numpy.searchsorted(kept, tolerance)) + 1
+	return vh[:n], u[:, :n] * s[:n]
+
+
+def complex_snr(z):
+	"""Combine template outputs stored as consecutive (cosine, sine) pairs
+	of rows into complex SNR time series."""
+	return z[0::2] + 1j * z[1::2]
+
+
+def throughput(filt, duration=64., block_length=4096, seed=None):
+	"""Filter duration seconds of white noise in blocks of block_length
+	samples through filt, which may be an LLOIDFilter or any other streaming
+	filter with a rate attribute, such as fdfilter.OverlapSaveFilter.
+	Returns the number of samples processed per second of wall-clock time."""
+	x = numpy.random.RandomState(seed).randn(int(duration * filt.rate))
+	start = time.time()
+	for i in range(0, len(x), block_length):
+		filt(x[i:i + block_length])
+	return len(x) / (time.time() - start)
@@ -0,0 +1,177 @@
+"""
+One-pass, bounded-memory statistics of match results for the ROC curves and
+histograms.
+
+A MatchSummary accumulates matches into a fixed, fine grid of bins on
+[0, 1], plus exact counts, extrema and moments. Its memory does not depend
+on the number of matches. Fraction-above-threshold curves are exact at the
+bin edges, which with the default 100,000 bins are 1e-5 apart, and are
+interpolated between them. Quantiles are interpolated the same way, so they
+can differ from those of the raw matches by a bin width plus the gap between
+neighbouring matches, which dominates unless there are many matches per
+bin: about 1e-4 in match for 10^5 matches. Summaries of disjoint chunks,
+such as those built by parallel workers, add together exactly.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('MatchSummary', 'summarize_store')
+
+import numpy
+from matchstore import MatchStore, default_store
+
+
+class MatchSummary(object):
+	"""Mergeable fixed-bin sketch of a distribution of matches."""
+
+	def __init__(self, num_bins=100000, lo=0., hi=1.):
+		self.lo = float(lo)
+		self.hi = float(hi)
+		# Bin 0 counts values below lo; the last bin counts values at or
+		# above hi.
+		self.counts = numpy.zeros(num_bins + 2, dtype=numpy.int64)
+		self.count = 0
+		self.total = 0.
+		self.total_sq = 0.
+		self.minimum = numpy.inf
+		self.maximum = -numpy.inf
+
+	@property
+	def num_bins(self):
+		return len(self.counts) - 2
+
+	@property
+	def edges(self):
+		return numpy.linspace(self.lo, self.hi, self.num_bins + 1)
+
+	def update(self, values):
+		"""Add an array of matches. Returns self."""
+		values = numpy.asarray(values, dtype=float).ravel()
+		if not len(values):
+			return self
+		scale = self.num_bins / (self.hi - self.lo)
+		bins = numpy.floor((values - self.lo) * scale).astype(numpy.int64) + 1
+		numpy.clip(bins, 0, self.num_bins + 1, out=bins)
+		self.counts += numpy.bincount(bins, minlength=len(self.counts))
+		self.count += len(values)
+		self.total += values.sum()
+		self.total_sq += numpy.dot(values, values)
+		self.minimum = min(self.minimum, values.min())
+		self.maximum = max(self.maximum, values.max())
+		return self
+
+	def __iadd__(self, other):
+		if (self.num_bins, self.lo, self.hi) != (other.num_bins, other.lo, other.hi):
+			raise ValueError('cannot merge summaries with different bins')
+		self.counts += other.counts
+		self.count += other.count
+		self.total += other.total
+		self.total_sq += other.total_sq
+		self.minimum = min(self.minimum, other.minimum)
+		self.maximum = max(self.maximum, other.maximum)
+		return self
+
+	def __add__(self, other):
+		result = MatchSummary(self.num_bins, self.lo, self.hi)
+		result += self
+		result += other
+		return result
+
+	@property
+	def mean(self):
+		return self.total / self.count
+
+	@property
+	def std(self):
+		return numpy.sqrt(max(0., self.total_sq / self.count - self.mean**2))
+
+	def _cdf_knots(self):
+		"""Bin edges and the fraction of matches below each, with the
+		underflow and overflow bins pinned to the observed extrema."""
+		edges = self.edges
+		lo = min(self.lo, self.minimum)
+		hi = max(self.hi, self.maximum)
+		x = numpy.concatenate(([lo], edges, [hi]))
+		cdf = numpy.concatenate(([0.], numpy.cumsum(self.counts))) / float(self.count)
+		return x, cdf
+
+	def quantile(self, q):
+		"""Approximate quantiles q in [0, 1], interpolated within bins."""
+		x, cdf = self._cdf_knots()
+		q = numpy.asarray(q, dtype=float)
+		# Interpolate on the increasing part of the CDF only.
+		keep = numpy.concatenate(([True], numpy.diff(cdf) > 0))
+		result = numpy.interp(q, cdf[keep], x[keep])
+		return numpy.clip(result, self.minimum, self.maximum)
+
+	def fraction_above(self, thresholds):
+		"""Approximate fraction of matches greater than each threshold; this
+		is the ROC curve of the match distribution."""
+		x, cdf = self._cdf_knots()
+		return 1 - numpy.interp(thresholds, x, cdf)
+
+	def histogram(self, num_bins=100):
+		"""Counts in num_bins equal bins on [lo, hi], which must evenly divide
+		the sketch's bins, and their edges. Matches outside [lo, hi] are
+		counted in the first or last bin."""
+		if self.num_bins % num_bins:
+			raise ValueError('%d bins do not evenly divide %d' % (num_bins, self.num_bins))
+		counts = self.counts[1:-1].reshape(num_bins, -1).sum(axis=1)
+		counts[0] += self.counts[0]
+		counts[-1] += self.counts[-1]
+		return counts, numpy.linspace(self.lo, self.hi, num_bins + 1)
+
+
+def _group_key(record):
+	"""Key of the distribution a store record belongs to. A missing
+	tolerance is None rather than NaN, which would not compare equal to
+	itself."""
+	tolerance = float(record['tolerance'])
+	return (int(record['kind']), int(record['bank']),
+		None if numpy.isnan(tolerance) else tolerance, int(record['resample']))
+
+
+def _summarize_records(args):
+	store_dir, records, chunk_size, summary_args = args
+	values = MatchStore(store_dir).values
+	summaries = {}
+	for record in records:
+		summary = summaries.setdefault(_group_key(record), MatchSummary(*summary_args))
+		start = int(record['offset'])
+		stop = start + int(record['count'])
+		for i in range(start, stop, chunk_size):
+			summary.update(values[i:min(i + chunk_size, stop)])
+	return summaries
+
+
+def summarize_store(store_dir=None, processes=None, chunk_size=1 << 20, num_bins=100000):
+	"""Summarize every distribution in a matchstore store in one pass.
+	Matches are read in chunks of chunk_size from the memory map. If
+	processes is given, the records are split among that many worker
+	processes and their summaries merged.
+
+	Returns a dict mapping (kind, bank, tolerance, resample) to a
+	MatchSummary; see matchstore for the meaning of the key fields, except
+	that a missing tolerance is None."""
+	if store_dir is None:
+		store_dir = default_store
+	index = MatchStore(store_dir).index
+	summary_args = (num_bins,)
+	if not processes:
+		return _summarize_records((store_dir, index, chunk_size, summary_args))
+
+	from multiprocessing import Pool
+	pool = Pool(processes)
+	try:
+		parts = pool.map(_summarize_records,
+			[(store_dir, part, chunk_size, summary_args)
+			for part in numpy.array_split(index, processes)])
+	finally:
+		pool.close()
+		pool.join()
+	summaries = {}
+	for part in parts:
+		for key, summary in part.items():
+			if key in summaries:
+				summaries[key] += summary
+			else:
+				summaries[key] = summary
+	return summaries
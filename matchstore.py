@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Pack the match_*.out and resample_match_*.out result files into one indexed
+binary store, and select from it by key.
+
+The store is a directory holding two .npy files: values.npy, every match
+as float64 (or, optionally, float32) in one flat array, and index.npy, a
+table with one record per source file giving its key and the position of
+its matches in values.npy.
+Records are sorted by key, so all matches for a given kind, sub-bank and
+tolerance are contiguous and are read as one slice of a memory map.
+
+Keys are parsed from the file names:
+	match_<tolerance>_<bank>.out, e.g. match_0_9999_3.out is sub-bank 3 at
+		SVD tolerance 0.9999, written with an underscore for the decimal
+		point as in the svd_0_9.xml bank of envelope.py
+	resample_match_<resample>_<bank>.out, e.g. resample_match_2_10.out is
+		sub-bank 10 in resampling configuration 2
+Fields that do not apply are -1 (or NaN for the tolerance).
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('parse_name', 'convert', 'MatchStore', 'open_store')
+
+import glob
+import os
+import os.path
+import re
+import numpy
+from precision import working_dtype
+
+basedir = os.path.dirname(os.path.abspath(__file__))
+default_sources = os.path.join(basedir, 'data', '*match_*.out')
+default_store = os.path.join(basedir, 'data', 'matches')
+
+MATCH, RESAMPLE_MATCH = 0, 1
+
+index_dtype = [('kind', 'i1'), ('bank', 'i4'), ('tolerance', 'f8'),
+	('resample', 'i4'), ('offset', 'i8'), ('count', 'i8')]
+
+_patterns = (
+	(MATCH, re.compile(r'^match_(?P<tolerance>\d+_\d+)_(?P<bank>\d+)\.out$')),
+	(RESAMPLE_MATCH, re.compile(r'^resample_match_(?P<resample>\d+)_(?P<bank>\d+)\.out$')),
+)
+
+
+def parse_name(path):
+	"""Return the key (kind, bank, tolerance, resample) of a result file,
+	or None if its name does not match either pattern."""
+	name = os.path.basename(path)
+	for kind, pattern in _patterns:
+		match = pattern.match(name)
+		if match:
+			fields = match.groupdict()
+			return (kind, int(fields['bank']),
+				float(fields['tolerance'].replace('_', '.')) if 'tolerance' in fields else numpy.nan,
+				int(fields.get('resample', -1)))
+	return None
+
+
+def _sort_key(key):
+	kind, bank, tolerance, resample = key
+	return (kind, bank, -1 if numpy.isnan(tolerance) else tolerance, resample)
+
+
+def convert(sources=default_sources, store=default_store, precision='double'):
+	"""Parse the result files matching the glob pattern sources and write
+	them to the store directory, in double or single precision. Matches lie
+	in [0, 1], so single precision keeps 7 of the 25 digits in the files,
+	more than the statistics of matchstats resolve. Returns the number of
+	files packed."""
+	keyed = [(parse_name(path), path) for path in glob.glob(sources)]
+	keyed = sorted(((key, path) for key, path in keyed if key is not None),
+		key=lambda item: _sort_key(item[0]))
+	arrays = [numpy.atleast_1d(numpy.loadtxt(path, dtype=float)) for key, path in keyed]
+	index = numpy.empty(len(keyed), dtype=index_dtype)
+	offset = 0
+	for record, (key, path), values in zip(index, keyed, arrays):
+		record['kind'], record['bank'], record['tolerance'], record['resample'] = key
+		record['offset'] = offset
+		record['count'] = len(values)
+		offset += len(values)
+
+	if not os.path.isdir(store):
+		os.makedirs(store)
+	# Write both files to temporary names first, so that an interrupted run
+	# leaves the previous store intact. The index is removed before the
+	# values are replaced and put back last; its presence marks a complete
+	# store.
+	values = (numpy.concatenate(arrays).astype(working_dtype(precision)) if arrays
+		else numpy.zeros(0, working_dtype(precision)))
+	paths = []
+	for name, array in (('values.npy', values), ('index.npy', index)):
+		path = os.path.join(store, name)
+		tmp_path = '%s.%d.tmp' % (path, os.getpid())
+		with open(tmp_path, 'wb') as f:
+			numpy.save(f, array)
+		paths.append((tmp_path, path))
+	index_path = os.path.join(store, 'index.npy')
+	if os.path.exists(index_path):
+		os.remove(index_path)
+	for tmp_path, path in paths:
+		os.rename(tmp_path, path)
+	return len(index)
+
+
+class MatchStore(object):
+	"""Read-only view of a store written by convert."""
+
+	def __init__(self, store=default_store):
+		self.index = numpy.load(os.path.join(store, 'index.npy'))
+		self.values = numpy.load(os.path.join(store, 'values.npy'), mmap_mode='r')
+
+	def records(self, kind=None, bank=None, tolerance=None, resample=None):
+		"""Index records matching all of the given key fields."""
+		mask = numpy.ones(len(self.index), dtype=bool)
+		for field, value in (('kind', kind), ('bank', bank), ('resample', resample)):
+			if value is not None:
+				mask &= self.index[field] == value
+		if tolerance is not None:
+			mask &= numpy.isclose(self.index['tolerance'], tolerance, rtol=0, atol=1e-12)
+		return self.index[mask]
+
+	def select(self, **key):
+		"""Matches of all records selected as by records(), in store order.
+		If they are contiguous, the result is a slice of the memory map and
+		no data is copied."""
+		records = self.records(**key)
+		if not len(records):
+			return numpy.zeros(0)
+		starts = records['offset']
+		stops = starts + records['count']
+		if numpy.all(starts[1:] == stops[:-1]):
+			return self.values[starts[0]:stops[-1]]
+		return numpy.concatenate([self.values[start:stop] for start, stop in zip(starts, stops)])
+
+	def tolerances(self, bank=None):
+		"""SVD tolerances present in the store."""
+		records = self.records(kind=MATCH, bank=bank)
+		return numpy.unique(records['tolerance'])
+
+	def resamples(self):
+		"""Resampling configurations present in the store."""
+		return numpy.unique(self.records(kind=RESAMPLE_MATCH)['resample'])
+
+
+def open_store(sources=default_sources, store=default_store):
+	"""Open the store, first (re)building it if it is missing or older than
+	any of the result files matching sources."""
+	index_path = os.path.join(store, 'index.npy')
+	try:
+		built = os.path.getmtime(index_path)
+	except OSError:
+		built = None
+	if built is None or any(os.path.getmtime(path) > built for path in glob.glob(sources)):
+		convert(sources, store)
+	return MatchStore(store)
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options]', option_list = [
+		Option("--sources", default=default_sources, metavar="GLOB",
+			help="result files to pack (default: %default)"),
+		Option("--store", default=default_store, metavar="DIR",
+			help="output directory (default: %default)"),
+		Option("--precision", default="double",
+			help="double or single (default: %default)"),
+	]).parse_args()
+	if len(args) > 0:
+		raise ValueError("Too many arguments")
+	convert(opts.sources, opts.store, opts.precision)
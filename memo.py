@@ -0,0 +1,185 @@
+"""
+Content-addressed, size-bounded on-disk memoization of functions that
+compute arrays.
+
+A memoized call is keyed by a SHA-1 hash of the function's name, its code,
+and the values of all of its arguments: arrays are hashed by dtype, shape
+and contents, and numbers, strings, None, and lists, tuples and dicts of
+them, by value. The code of a function imported from a module is the whole
+module file, so that editing any helper in that module invalidates its
+results; the code of a function defined in a script is just its own source,
+so that editing the rest of the script does not. Helpers in other modules
+are not seen, so name those modules when memoizing, as in
+
+	memoize(accumulated_snr, depends=('precision',))
+
+and their files are hashed too.
+
+Results, which may be arrays, numbers, None, or lists, tuples and
+namedtuples of them, are stored as .npz files in data/cache/memo. Every hit
+refreshes a file's modification time, and after every store the least
+recently used files are deleted until the cache fits in its size limit.
+
+Restyling a figure or reformatting a table therefore does not recompute the
+physics behind it.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('Memo', 'memoize')
+
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import numbers
+import os
+import os.path
+import numpy
+
+default_cache_dir = os.path.join(
+	os.path.dirname(os.path.abspath(__file__)), 'data', 'cache', 'memo')
+
+
+def _hash_value(sha, value):
+	"""Feed an argument value into the hash object sha."""
+	if value is None or isinstance(value, (numbers.Number, str, bytes)):
+		sha.update(repr((type(value).__name__, value)).encode('utf-8'))
+	elif isinstance(value, numpy.ndarray):
+		value = numpy.ascontiguousarray(value)
+		sha.update(repr(('ndarray', value.dtype.str, value.shape)).encode('ascii'))
+		sha.update(value.tobytes())
+	elif isinstance(value, (list, tuple)):
+		sha.update(repr((type(value).__name__, len(value))).encode('ascii'))
+		for item in value:
+			_hash_value(sha, item)
+	elif isinstance(value, dict):
+		sha.update(repr(('dict', len(value))).encode('ascii'))
+		for key in sorted(value):
+			_hash_value(sha, key)
+			_hash_value(sha, value[key])
+	else:
+		raise TypeError('cannot memoize an argument of type %s' % type(value).__name__)
+
+
+def _flatten(value, leaves):
+	"""JSON-serializable description of the structure of a result, whose
+	arrays are appended to leaves."""
+	if value is None:
+		return None
+	elif isinstance(value, tuple) and hasattr(value, '_fields'):
+		return {'namedtuple': '%s:%s' % (type(value).__module__, type(value).__name__),
+			'items': [_flatten(item, leaves) for item in value]}
+	elif isinstance(value, (list, tuple)):
+		return {type(value).__name__: [_flatten(item, leaves) for item in value]}
+	elif isinstance(value, numbers.Number):
+		leaves.append(numpy.asarray(value))
+		return {'scalar': len(leaves) - 1}
+	else:
+		leaves.append(numpy.asarray(value))
+		return {'array': len(leaves) - 1}
+
+
+def _unflatten(structure, leaves):
+	if structure is None:
+		return None
+	elif 'namedtuple' in structure:
+		module, name = structure['namedtuple'].split(':')
+		cls = getattr(importlib.import_module(module), name)
+		return cls(*[_unflatten(item, leaves) for item in structure['items']])
+	elif 'tuple' in structure:
+		return tuple(_unflatten(item, leaves) for item in structure['tuple'])
+	elif 'list' in structure:
+		return [_unflatten(item, leaves) for item in structure['list']]
+	elif 'scalar' in structure:
+		return leaves['leaf%d' % structure['scalar']].item()
+	else:
+		return leaves['leaf%d' % structure['array']]
+
+
+class Memo(object):
+	"""Decorator that memoizes functions in directory, which is kept below
+	max_bytes by deleting the least recently used results."""
+
+	def __init__(self, directory=default_cache_dir, max_bytes=1 << 30):
+		self.directory = directory
+		self.max_bytes = max_bytes
+
+	def __call__(self, func, depends=()):
+		"""Memoize func. depends names the modules, other than func's own,
+		whose code its results depend on."""
+		sha = hashlib.sha1(('%s.%s' % (func.__module__, func.__name__)).encode('utf-8'))
+		if func.__module__ == '__main__':
+			sha.update(inspect.getsource(func).encode('utf-8'))
+		else:
+			with open(inspect.getsourcefile(func), 'rb') as f:
+				sha.update(f.read())
+		for module in depends:
+			with open(inspect.getsourcefile(importlib.import_module(module)), 'rb') as f:
+				sha.update(f.read())
+		version = sha.hexdigest()
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			sha = hashlib.sha1(version.encode('ascii'))
+			_hash_value(sha, list(args))
+			_hash_value(sha, kwargs)
+			path = os.path.join(self.directory, sha.hexdigest() + '.npz')
+			try:
+				with numpy.load(path) as data:
+					result = _unflatten(json.loads(str(data['structure'])), data)
+			except (IOError, OSError, KeyError, ValueError):
+				pass
+			else:
+				try:
+					os.utime(path, None)
+				except OSError:
+					pass
+				return result
+			result = func(*args, **kwargs)
+			self._store(path, result)
+			return result
+		return wrapper
+
+	def _store(self, path, result):
+		leaves = []
+		structure = json.dumps(_flatten(result, leaves))
+		arrays = dict(('leaf%d' % i, leaf) for i, leaf in enumerate(leaves))
+		try:
+			if not os.path.isdir(self.directory):
+				os.makedirs(self.directory)
+			# Write to a temporary name first so that concurrent readers never
+			# see a partially written file.
+			tmp_path = '%s.%d.tmp' % (path, os.getpid())
+			with open(tmp_path, 'wb') as f:
+				numpy.savez(f, structure=numpy.array(structure), **arrays)
+			os.rename(tmp_path, path)
+			self.evict()
+		except (IOError, OSError):
+			pass
+
+	def evict(self):
+		"""Delete the least recently used results until the rest fit in
+		max_bytes."""
+		entries = []
+		for name in os.listdir(self.directory):
+			if name.endswith('.npz'):
+				try:
+					stat = os.stat(os.path.join(self.directory, name))
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, name))
+		entries.sort()
+		total = sum(size for mtime, size, name in entries)
+		for mtime, size, name in entries:
+			if total <= self.max_bytes:
+				break
+			try:
+				os.remove(os.path.join(self.directory, name))
+			except OSError:
+				pass
+			total -= size
+
+
+# Default memoizer, used as a decorator: memoize(func), or
+# memoize(func, depends=(...))
+memoize = Memo()
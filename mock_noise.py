@@ -0,0 +1,284 @@
+"""
+Constant-memory generator of mock aLIGO-like colored Gaussian noise.
+
+The noise model is the sum of five IIR filters, each driven by its own
+stream of white Gaussian noise, at 16384 Hz. NoiseGenerator produces it in
+fixed-size blocks, carrying each filter's state from block to block, and
+WelchPSD estimates its power spectral density incrementally. Hours of mock
+data can therefore be generated and analyzed in the memory of one block.
+
+For longer runs, produce writes the noise to a .npy file using a pool of
+worker processes, with reproducible, independently seeded chunks; run this
+module as a script to do so and to report the speed as a multiple of real
+time. The chunks' random streams are spawned with numpy.random.SeedSequence,
+which needs NumPy 1.17 or later.
+
+Everything can be done in single precision (see precision). The branches
+whose poles lie within 1% of the unit circle amplify rounding errors by
+their large gain, so they are always filtered in double precision.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('rate', 'b', 'a', 'NoiseGenerator', 'WelchPSD', 'produce')
+
+import numpy
+from numpy import cos, pi
+from scipy import signal
+from precision import working_dtype
+
+# Sample rate in Hz
+rate = 16384
+
+
+# Filter coefficients
+
+b1 = [4e-28]
+a1 = [1., -2 * .99995 * cos(2*pi * 9.103 / 16384), .99995**2]
+
+b2 = [1.1e-23, -1.1e-23]
+a2 = [1.]
+
+b3 = [1e-27]
+a3 = [1., -2 * .999, .999**2]
+
+b4 = [4e-26]
+a4 = [1., -2 * .87 * cos(2*pi * 50 / 16384), .87**2]
+
+b5 = [6.5e-24]
+a5 = [1, 2*.45, .45**2]
+
+b = [b1, b2, b3, b4, b5]
+a = [a1, a2, a3, a4, a5]
+
+
+def _branch_dtypes(dtype):
+	"""Working dtype of each branch: dtype, except float64 for branches
+	with poles within 1% of the unit circle."""
+	return [numpy.dtype(numpy.float64) if len(aa) > 1 and numpy.max(numpy.abs(numpy.roots(aa))) > 0.99
+		else dtype for aa in a]
+
+
+class NoiseGenerator(object):
+	"""Iterator over consecutive blocks of block_length samples of mock
+	noise. The first settle samples, during which the filters are still
+	ringing up from rest, are discarded. random_state may be a seed or a
+	numpy.random.RandomState; by default the global numpy.random stream is
+	used. precision is 'double' or 'single'; either way the same random
+	numbers are drawn."""
+
+	def __init__(self, block_length=rate, settle=rate, random_state=None, precision='double'):
+		self.block_length = int(block_length)
+		self.dtype = working_dtype(precision)
+		self._dtypes = _branch_dtypes(self.dtype)
+		self._b = [numpy.asarray(bb, dtype) for bb, dtype in zip(b, self._dtypes)]
+		self._a = [numpy.asarray(aa, dtype) for aa, dtype in zip(a, self._dtypes)]
+		if random_state is None:
+			self._random = numpy.random
+		elif isinstance(random_state, numpy.random.RandomState):
+			self._random = random_state
+		else:
+			self._random = numpy.random.RandomState(random_state)
+		self._zi = [numpy.zeros(max(len(aa), len(bb)) - 1, dtype)
+			for bb, aa, dtype in zip(b, a, self._dtypes)]
+		for i in range(0, int(settle), self.block_length):
+			self.next_block(min(self.block_length, settle - i))
+
+	def next_block(self, n=None):
+		"""Return the next n samples (by default, block_length)."""
+		if n is None:
+			n = self.block_length
+		x = self._random.randn(len(b), n)
+		y = numpy.zeros(n, self.dtype)
+		for i, (bb, aa, xx, dtype) in enumerate(zip(self._b, self._a, x, self._dtypes)):
+			yy, self._zi[i] = signal.lfilter(bb, aa, xx.astype(dtype, copy=False), zi=self._zi[i])
+			y += yy
+		return y
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		return self.next_block()
+
+	next = __next__
+
+
+class WelchPSD(object):
+	"""Online Welch estimate of a one-sided power spectral density, with
+	Hann-windowed segments of nfft samples overlapping by noverlap and the
+	same normalization as matplotlib's psd. Feed it blocks of any length.
+	precision is that of the transforms, 'double' or 'single'; the
+	periodograms are squared and averaged in double precision."""
+
+	def __init__(self, nfft, fs, noverlap=0, precision='double'):
+		self.nfft = int(nfft)
+		self.fs = float(fs)
+		self.step = self.nfft - int(noverlap)
+		self.dtype = working_dtype(precision)
+		self.window = numpy.hanning(self.nfft).astype(self.dtype)
+		self._buf = numpy.zeros(0, self.dtype)
+		self._sum = numpy.zeros(self.nfft // 2 + 1)
+		self.num_segments = 0
+
+	def update(self, x):
+		"""Add the samples x, which follow those already added."""
+		buf = numpy.concatenate((self._buf, numpy.asarray(x, dtype=self.dtype)))
+		num = (len(buf) - self.nfft) // self.step + 1 if len(buf) >= self.nfft else 0
+		for i in range(num):
+			segment = buf[i * self.step:i * self.step + self.nfft]
+			# Square in float64: the periodogram of strain underflows float32
+			self._sum += numpy.square(abs(numpy.fft.rfft(self.window * segment)), dtype=numpy.float64)
+		self.num_segments += num
+		self._buf = buf[num * self.step:]
+
+	@property
+	def frequencies(self):
+		return numpy.fft.rfftfreq(self.nfft, 1 / self.fs)
+
+	@property
+	def psd(self):
+		"""Current estimate of the PSD at self.frequencies."""
+		psd = self._sum / (self.num_segments * self.fs * numpy.sum(self.window**2, dtype=numpy.float64))
+		# One-sided: double everything except DC and (for even nfft) Nyquist
+		psd[1:(self.nfft + 1) // 2] *= 2
+		return psd
+
+
+# Parallel production
+#
+# The output is divided into chunks of a fixed length, and every chunk and
+# branch draws its white noise from its own stream, seeded by spawning from
+# one SeedSequence. Because each branch is linear, the filter state at the
+# end of a chunk is the state that its own noise leaves from rest, plus the
+# state at its beginning propagated through the chunk. The first pass
+# computes the former for every chunk in parallel; the states are then
+# chained in order, which is cheap; and the second pass filters every chunk
+# from its true initial state in parallel. Neither pass depends on how the
+# chunks are shared among processes, so the output is bit-identical for any
+# number of workers.
+
+def _chunk_noise(seed, chunk, branch, n, dtype=numpy.float64):
+	"""White noise driving one branch in one chunk."""
+	sequence = numpy.random.SeedSequence(seed, spawn_key=(chunk, branch))
+	return numpy.random.Generator(numpy.random.PCG64(sequence)).standard_normal(n, dtype=dtype)
+
+
+def _zero_state(bb, aa):
+	return numpy.zeros(max(len(aa), len(bb)) - 1)
+
+
+def _final_states(args):
+	"""Final filter state of each branch in a chunk, starting from rest."""
+	seed, chunk, n, dtypes = args
+	return [signal.lfilter(bb, aa, _chunk_noise(seed, chunk, i, n, dtype), zi=_zero_state(bb, aa))[1]
+		for i, (bb, aa, dtype) in enumerate(zip(b, a, dtypes))]
+
+
+def _write_chunk(args):
+	"""Filter a chunk from its initial states and write the part of it that
+	falls at or after sample 0 of the output."""
+	seed, chunk, n, states, path, start, dtypes = args
+	out = numpy.load(path, mmap_mode='r+')
+	y = numpy.zeros(n, out.dtype)
+	for i, (bb, aa, dtype) in enumerate(zip(b, a, dtypes)):
+		y += signal.lfilter(numpy.asarray(bb, dtype), numpy.asarray(aa, dtype),
+			_chunk_noise(seed, chunk, i, n, dtype), zi=states[i].astype(dtype))[0]
+	if start < 0:
+		y = y[-start:]
+		start = 0
+	out[start:start + len(y)] = y
+	out.flush()
+	del out
+
+
+def _transition(n):
+	"""For each branch, the matrix that propagates a filter state through n
+	samples of zero input."""
+	result = []
+	for bb, aa in zip(b, a):
+		order = len(_zero_state(bb, aa))
+		zeros = numpy.zeros(n)
+		result.append(numpy.column_stack([
+			signal.lfilter(bb, aa, zeros, zi=numpy.eye(order)[j])[1]
+			for j in range(order)]))
+	return result
+
+
+def produce(path, duration, seed=0, chunk_length=64 * rate, settle=rate, processes=None,
+		precision='double'):
+	"""Write duration seconds of mock noise at 16384 Hz to the .npy file at
+	path, as float64 or, if precision is 'single', float32, without holding
+	it in memory. The first settle samples, during which the filters ring up
+	from rest, are discarded.
+
+	The noise is a function of seed, chunk_length and precision only. If
+	processes is given, the chunks are filtered by a pool of that many
+	worker processes. The filter states are chained between chunks in
+	double precision.
+
+	Returns the wall-clock time taken in seconds."""
+	from numpy.lib.format import open_memmap
+	import time
+
+	start_time = time.time()
+	num_samples = int(round(duration * rate))
+	chunk_length = int(chunk_length)
+	settle = int(settle)
+	starts = range(-settle, num_samples, chunk_length)
+	lengths = [min(chunk_length, num_samples - start) for start in starts]
+
+	dtypes = _branch_dtypes(working_dtype(precision))
+	out = open_memmap(path, mode='w+', dtype=working_dtype(precision), shape=(num_samples,))
+	del out
+
+	if processes:
+		from multiprocessing import Pool
+		pool = Pool(processes)
+		mapper = lambda func, iterable: pool.map(func, iterable, chunksize=1)
+	else:
+		pool = None
+		mapper = lambda func, iterable: list(map(func, iterable))
+	try:
+		final_states = mapper(_final_states,
+			[(seed, chunk, n, dtypes) for chunk, n in enumerate(lengths)])
+
+		# Chain the states through the chunks in order
+		transitions = {}
+		states = [[_zero_state(bb, aa) for bb, aa in zip(b, a)]]
+		for n, own in zip(lengths[:-1], final_states[:-1]):
+			if n not in transitions:
+				transitions[n] = _transition(n)
+			states.append([numpy.dot(T, state) + final
+				for T, state, final in zip(transitions[n], states[-1], own)])
+
+		mapper(_write_chunk, [(seed, chunk, n, state, path, start, dtypes)
+			for chunk, (n, state, start) in enumerate(zip(lengths, states, starts))])
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+	return time.time() - start_time
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	import sys
+	opts, args = OptionParser(
+		description = "Write mock noise to a .npy file.",
+		usage = '%prog [options] OUTPUT.npy', option_list = [
+		Option("--duration", type=float, default=3600., metavar="SECONDS",
+			help="length of the output (default: %default)"),
+		Option("--seed", type=int, default=0,
+			help="random seed (default: %default)"),
+		Option("--chunk-length", type=int, default=64 * rate, metavar="SAMPLES",
+			help="samples per independently seeded chunk; the output depends on it (default: %default)"),
+		Option("--processes", "-j", type=int, default=None,
+			help="number of worker processes (default: run serially)"),
+		Option("--precision", default="double",
+			help="double or single (default: %default)"),
+	]).parse_args()
+	if len(args) != 1:
+		raise ValueError("Expected one output file")
+	elapsed = produce(args[0], opts.duration, opts.seed, opts.chunk_length,
+		processes=opts.processes, precision=opts.precision)
+	sys.stdout.write("%g s of data in %.1f s: %.1f x real time\n" % (
+		opts.duration, elapsed, opts.duration / elapsed))
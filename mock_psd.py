@@ -2,32 +2,13 @@ import sys
 sys.path.append('../lloid_aligo')
 
 import noisemodels
+from mock_noise import b, a, rate, NoiseGenerator, WelchPSD
+from precision import default_precision
 from scipy import signal
-from numpy import cos, pi, sqrt, random
+from numpy import pi, sqrt
 import pylab
 
 
-# Filter coefficients
-
-b1 = [4e-28]
-a1 = [1., -2 * .99995 * cos(2*pi * 9.103 / 16384), .99995**2]
-
-b2 = [1.1e-23, -1.1e-23]
-a2 = [1.]
-
-b3 = [1e-27]
-a3 = [1., -2 * .999, .999**2]
-
-b4 = [4e-26]
-a4 = [1., -2 * .87 * cos(2*pi * 50 / 16384), .87**2]
-
-b5 = [6.5e-24]
-a5 = [1, 2*.45, .45**2]
-
-b = [b1, b2, b3, b4, b5]
-a = [a1, a2, a3, a4, a5]
-
-
 # Calculate total filter bank response
 
 h = 0.
@@ -38,15 +19,18 @@ h = sqrt(h) * sqrt(16384) * 3. / 4
 w *= 16384/(2*pi)
 
 
-# Generate some colored Gaussian noise
+# Generate 100 s of colored Gaussian noise, one second at a time, and
+# estimate its PSD as we go
 
-x = random.randn(len(b), 16384*101)
-y = sum(signal.lfilter(bb, aa, xx) for bb, aa, xx in zip(b, a, x))
-Pxx, freqs = pylab.psd(y[16384:] * sqrt(16384) * 3. / 4, NFFT=16384, Fs=16384, noverlap=4096)
+noise = NoiseGenerator(rate, precision=default_precision)
+welch = WelchPSD(16384, rate, noverlap=4096, precision=default_precision)
+for i in range(100):
+	welch.update(noise.next_block() * sqrt(16384) * 3. / 4)
+Pxx, freqs = welch.psd, welch.frequencies
 
 # Read GWINC model
 
-gwinc_f, gwinc_h = dict(noisemodels.asds)['zero det., high power'].T
+gwinc_f, gwinc_h = noisemodels.asds['zero det., high power'].T
 
 
 # Plot
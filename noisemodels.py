@@ -1,11 +1,35 @@
 """
 Load power spectra for various LIGO noise estimates and measurements.
+
+The noise models are exposed through the read-only mapping `asds`, which
+loads each model only when it is first looked up. A model's text file is
+parsed once and converted to a binary .npy file in data/cache; later loads
+memory-map that file instead. Cache entries are keyed by the SHA-1 digest of
+the source file, so editing a spectrum invalidates its entry.
+
+The mapping `psds` holds a PSD object for each model, which resamples the
+spectrum onto any frequency grid by log-log interpolation and remembers the
+result for the last few grids that it was asked for. Use it, or resample for
+many models at once, instead of interpolating the raw arrays by hand.
 """
 __author__ = "Leo Singer <leo.singer@ligo.org>"
-__all__ = ('psds',)
+__all__ = ('asds', 'psds', 'asd_paths', 'plotkwargs', 'load_asd', 'stores_psd',
+	'PSD', 'resample')
 
-from numpy import sqrt, loadtxt
+import numpy
+from numpy import sqrt, loadtxt, save, load
+from collections import OrderedDict
+import hashlib
+import os
 import os.path
+from stages import stage
+try:
+	from collections.abc import Mapping
+except ImportError:
+	from collections import Mapping
+
+basedir = os.path.dirname(os.path.abspath(__file__))
+cache_dir = os.path.join(basedir, 'data', 'cache')
 
 asd_paths = (
 	('LHO (best S5)', 'data/max_H1-TMPLTBANK-871198828-2048.strainspec_asd_v4.txt'),
@@ -18,6 +42,10 @@ asd_paths = (
 	('zero det., high power', 'data/T0900288/ZERO_DET_high_P.txt'),
 )
 
+# "LHO (best S6)" actually stores PSD, not ASD. For other measured spectra,
+# which may be either, see stores_psd.
+psd_names = frozenset(['LHO (best S6)'])
+
 plotkwargs = {
 	'LHO (best S5)': {'color': '0.5', 'linestyle': '-', 'linewidth': 0.5},
 	'LHO (best S6)': {'color': 'k', 'linestyle': '-', 'linewidth': 0.5},
@@ -29,9 +57,196 @@ plotkwargs = {
 	'zero det., high power': {'color': 'k', 'linestyle': '-'}
 }
 
-asds = tuple( (key, loadtxt(os.path.join(os.path.dirname(__file__), value))) for key, value in asd_paths )
 
-# "LHO (best S6)" actually stores PSD, not ASD.
-for name, data in asds:
-	if name == 'LHO (best S6)':
-		data[:, 1] = sqrt(data[:, 1])
\ No newline at end of file
+def _digest(path, is_psd):
+	"""SHA-1 of the file at path, salted with the PSD->ASD conversion flag."""
+	sha = hashlib.sha1(b'psd' if is_psd else b'asd')
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			sha.update(chunk)
+	return sha.hexdigest()
+
+
+def load_asd(path, is_psd=False):
+	"""Return an (N, 2) array of frequency and amplitude spectral density
+	read from the two-column text file at path. If is_psd is true, the file
+	stores a power spectral density and its square root is taken.
+
+	The result is a read-only memory map of the cached binary copy. If the
+	cache directory cannot be written, the freshly parsed array is returned."""
+	# Files in different directories may share a base name (there are two
+	# copies of ZERO_DET_high_P.txt), so qualify it with a hash of the path.
+	abspath = os.path.abspath(path)
+	cache_name = '%s-%s' % (os.path.basename(abspath),
+		hashlib.sha1(abspath.encode('utf-8')).hexdigest()[:8])
+	cache_path = os.path.join(cache_dir,
+		'%s.%s.npy' % (cache_name, _digest(path, is_psd)))
+	try:
+		return load(cache_path, mmap_mode='r')
+	except (IOError, OSError):
+		pass
+
+	data = loadtxt(path)
+	if is_psd:
+		data[:, 1] = sqrt(data[:, 1])
+
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		# Drop entries for older versions of the same file.
+		for entry in os.listdir(cache_dir):
+			if entry.startswith(cache_name + '.') and entry.endswith('.npy'):
+				os.remove(os.path.join(cache_dir, entry))
+		# Write to a temporary name first so that concurrent readers never
+		# see a partially written file.
+		tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+		with open(tmp_path, 'wb') as f:
+			save(f, data)
+		os.rename(tmp_path, cache_path)
+	except (IOError, OSError):
+		return data
+	return load(cache_path, mmap_mode='r')
+
+
+# Strain ASDs of ground-based detectors lie between about 1e-25 and 1e-17
+# Hz^-1/2, so strain PSDs lie below about 1e-34 Hz^-1.
+_psd_threshold = 1e-30
+
+
+def stores_psd(path, num_rows=100):
+	"""Guess whether the two-column text file at path stores a power
+	spectral density rather than an amplitude spectral density, from the
+	magnitude of its first num_rows values."""
+	values = []
+	with open(path) as f:
+		for line in f:
+			fields = line.split('#', 1)[0].split()
+			if len(fields) == 1:
+				raise ValueError('%s is not a two-column spectrum' % path)
+			elif fields:
+				values.append(float(fields[1]))
+				if len(values) >= num_rows:
+					break
+	if not values:
+		raise ValueError('%s contains no spectrum' % path)
+	return numpy.median(values) < _psd_threshold
+
+
+class LazyASDs(Mapping):
+	"""Ordered, read-only mapping from noise model name to an (N, 2) array of
+	frequency and ASD. Each model is loaded on first access and kept."""
+
+	def __init__(self, paths, psd_names=()):
+		self._paths = OrderedDict(paths)
+		self._psd_names = frozenset(psd_names)
+		self._loaded = {}
+
+	def __getitem__(self, name):
+		try:
+			return self._loaded[name]
+		except KeyError:
+			with stage('load_asd'):
+				data = self._loaded[name] = load_asd(
+					self.path(name), name in self._psd_names)
+			return data
+
+	def __iter__(self):
+		return iter(self._paths)
+
+	def __len__(self):
+		return len(self._paths)
+
+	def path(self, name):
+		"""Absolute path of the text file for the named model."""
+		return os.path.join(basedir, self._paths[name])
+
+
+asds = LazyASDs(asd_paths, psd_names)
+
+
+def _grid_signature(f):
+	"""SHA-1 digest identifying a frequency grid by its contents."""
+	f = numpy.ascontiguousarray(f, dtype=float)
+	sha = hashlib.sha1(repr(f.shape).encode('ascii'))
+	sha.update(f.tobytes())
+	return sha.digest()
+
+
+class PSD(object):
+	"""Noise spectrum sampled at frequencies f with amplitude spectral
+	density asd. Between samples it is interpolated linearly in log-log
+	space; outside them it is held constant. The results for the last
+	cache_size grids are kept, read-only, keyed by the grids' contents."""
+
+	def __init__(self, f, asd, cache_size=8):
+		self.f = numpy.asarray(f, dtype=float)
+		self._log_f = numpy.log(self.f)
+		self._log_asd = numpy.log(numpy.asarray(asd, dtype=float))
+		self.cache_size = cache_size
+		self._cache = OrderedDict()
+
+	@classmethod
+	def load(cls, path, is_psd=False):
+		"""PSD from a two-column text file, read as by load_asd."""
+		f, asd = load_asd(path, is_psd).T
+		return cls(f, asd)
+
+	def _resample(self, f, log_f=None, signature=None):
+		if signature is None:
+			signature = _grid_signature(f)
+		try:
+			result = self._cache.pop(signature)
+		except KeyError:
+			if log_f is None:
+				log_f = numpy.log(f)
+			result = numpy.exp(numpy.interp(log_f, self._log_f, self._log_asd))
+			result.setflags(write=False)
+		self._cache[signature] = result
+		while len(self._cache) > self.cache_size:
+			self._cache.popitem(last=False)
+		return result
+
+	def asd(self, f):
+		"""Amplitude spectral density at frequencies f."""
+		return self._resample(numpy.asarray(f, dtype=float))
+
+	def psd(self, f):
+		"""Power spectral density at frequencies f."""
+		return self.asd(f)**2
+
+
+class LazyPSDs(Mapping):
+	"""Ordered, read-only mapping from noise model name to PSD, built on
+	first access from a mapping of (N, 2) arrays such as asds."""
+
+	def __init__(self, asds):
+		self._asds = asds
+		self._loaded = {}
+
+	def __getitem__(self, name):
+		try:
+			return self._loaded[name]
+		except KeyError:
+			f, asd = self._asds[name].T
+			psd = self._loaded[name] = PSD(f, asd)
+			return psd
+
+	def __iter__(self):
+		return iter(self._asds)
+
+	def __len__(self):
+		return len(self._asds)
+
+
+psds = LazyPSDs(asds)
+
+
+def resample(models, f):
+	"""Amplitude spectral densities of several PSD objects, or names of
+	models in psds, on the shared frequency grid f, as a
+	(len(models), len(f)) array."""
+	f = numpy.asarray(f, dtype=float)
+	log_f = numpy.log(f)
+	signature = _grid_signature(f)
+	models = [psds[model] if isinstance(model, str) else model for model in models]
+	return numpy.array([model._resample(f, log_f, signature) for model in models])
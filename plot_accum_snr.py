@@ -6,7 +6,10 @@ Also generate tex table and print to stdout.
 
 import sys
 from noisemodels import asds, plotkwargs
-from pylab import *
+from snr import snr_sweep
+from memo import memoize
+from plotutil import headless
+from stages import stage, report
 
 # Component mass 1 in M_sun
 m1 = 1.4
@@ -14,57 +17,50 @@ m1 = 1.4
 # Component mass 2 in M_sun
 m2 = 1.4
 
-# Total mass in M_sun
-M = m1 + m2
-
-# ISCO frequency in Hz
-fISCO = 4400 / M
-
-fig_width = 3.35
-fig_height = 2.75
-fig = figure(figsize=(fig_width,fig_height))
-
 f_lows = range(40, 0, -10)
 
-print r'\begin{tabular}{r' + 'c'*len(f_lows) + '}'
-print r'\hline\hline'
-print 'Noise model',
+sys.stdout.write(r'\begin{tabular}{r' + 'c'*len(f_lows) + '}' + '\n')
+sys.stdout.write(r'\hline\hline' + '\n')
+sys.stdout.write('Noise model')
 for f_low in f_lows:
-	print '&', f_low, 'Hz',
-print r'\\'
-print '\hline'
+	sys.stdout.write(' & %d Hz' % f_low)
+sys.stdout.write(r' \\' + '\n')
+sys.stdout.write(r'\hline' + '\n')
 
-for i, (name, data) in enumerate(asds):
+# Fractional SNR above each f_low and accumulated SNR curves for all noise
+# models, integrated from f_ISCO down to 10 Hz, memoized on disk
+with stage('snr_sweep'):
+	sweep = memoize(snr_sweep, depends=('inspiral', 'precision'))(
+		list(asds.values()), m1, m2, list(f_lows))
 
-	# Unpack frequency and amplitue spectral density from array
-	f, s = data.T
+for i, name in enumerate(asds):
 
-	# Compute size of frequency bins
-	df = diff(f)
+	# Print out row for data table
+	sys.stdout.write(name)
+	for frac_snr in sweep.fractional_snr[0, i]:
+		sys.stdout.write(' & %.1f' % (100 * frac_snr))
+	sys.stdout.write(r' \\' + '\n')
+sys.stdout.write(r'\hline' + '\n')
+sys.stdout.write(r'\end{tabular}' + '\n')
 
-	# Mask out values that are less than fISCO or greater than 10 Hz
-	mask = (f <= fISCO) & (f >= 10)
-	f = f[mask]
-	s = s[mask]
-	df = df[mask[:-1]]
+# Import matplotlib only now, so that the table does not wait for it
+with stage('import'):
+	headless()
+	from pylab import *
 
-	# Integrate SNR from f_high down to f_low
-	accum_snr = sqrt(cumsum((f**(-7./3) / s**2 * df)[::-1]))[::-1]
-	accum_snr /= accum_snr.max()
-	accum_snr *= 100
+fig_width = 3.35
+fig_height = 2.75
+fig = figure(figsize=(fig_width,fig_height))
 
-	# Print out row for data table
-	print name,
-	for f_low in f_lows:
-		print '&', '%.1f' % (accum_snr[f.searchsorted(f_low)]),
-	print r'\\'
+for i, name in enumerate(asds):
 
 	# Make plot
-	plot(f, accum_snr, 'k',
+	f = sweep.f[i]
+	accum_snr = 100 * sweep.accum_snr[0, i]
+	mask = isfinite(accum_snr)
+	plot(f[mask], accum_snr[mask], 'k',
 		label=name, **plotkwargs[name])
-print '\hline'
-print r'\end{tabular}'
-	
+
 xlim(80., 0)
 ylim(50, 100)
 grid(linewidth=0.1)
@@ -72,4 +68,6 @@ xlabel('low frequency cutoff $f_\mathrm{low}$ ($\mathrm{Hz}$)')
 ylabel('percent accumulated SNR')
 title(r'(c) Accumulated SNR vs. $f_\mathrm{low}$')
 plt.subplots_adjust(bottom=0.45/fig_height,top=1-0.2/fig_height,left=0.75/fig_width,right=(2.4+0.75)/fig_width)
-savefig(sys.argv[1])
+with stage('savefig'):
+	savefig(sys.argv[1])
+report(sys.argv[1])
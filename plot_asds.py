@@ -2,21 +2,30 @@
 
 import sys
 from noisemodels import asds, plotkwargs
-from pylab import *
+from plotutil import headless, plot_curve
+from stages import stage, report
+with stage('import'):
+	headless()
+	from pylab import *
 
 fig_width = 3.35
 fig_height = 2.75
 fig = figure(figsize=(fig_width,fig_height))
-for name, data in asds:
-	f, asd = data.T
-	loglog(f, asd, label=name, **plotkwargs[name])
+plt.subplots_adjust(bottom=0.45/fig_height,top=1-0.25/fig_height,left=0.75/fig_width,right=(2.4+0.75)/fig_width)
+xscale('log')
+yscale('log')
+xlim(9, 3000)
+with stage('plot'):
+	for name, data in asds.items():
+		f, asd = data.T
+		plot_curve(gca(), f, asd, dpi=360, label=name, **plotkwargs[name])
 #legend(loc=(1.05,0.0))
 xlabel('frequency ($\mathrm{Hz}$)')
 ylabel(r'amplitude spectral density ($1/\sqrt{\mathrm{Hz}}$)')
-xlim(9, 3000)
 grid(which='minor', color='gray', linewidth=0.1)
 grid(linestyle='--', color='k', which='major', linewidth=0.1)
 ylim(1e-24, 3e-21)
 title('(a) LIGO noise models')
-plt.subplots_adjust(bottom=0.45/fig_height,top=1-0.25/fig_height,left=0.75/fig_width,right=(2.4+0.75)/fig_width)
-savefig(sys.argv[1], dpi=360)
+with stage('savefig'):
+	savefig(sys.argv[1], dpi=360)
+report(sys.argv[1])
@@ -1,24 +1,26 @@
 #!/usr/bin/env python
 
-from gstlal import lloidplots
-from glue.ligolw import utils, lsctables
-import numpy
-import pylab
-import matplotlib
-from matplotlib import ticker
-from mpl_toolkits.axes_grid1.inset_locator import zoomed_inset_axes
-from mpl_toolkits.axes_grid1.inset_locator import mark_inset
+from stages import stage, report
+from plotutil import headless, density_raster
+with stage('import'):
+	headless()
+	from gstlal import lloidplots
+	import numpy
+	import pylab
+	import matplotlib
+	from matplotlib import ticker
+	from mpl_toolkits.axes_grid1.inset_locator import zoomed_inset_axes
+	from mpl_toolkits.axes_grid1.inset_locator import mark_inset
 import sys
+from bankindex import setdiff_rows, BankIndex
+from bankcache import load_columns
 
 column1 = 'mchirp'
 column2 = 'mtotal'
 
-small_table = lsctables.table.get_table(
-	utils.load_filename('data/tmpltbank.xml'),
-	lsctables.SnglInspiralTable.tableName
-)
-n_small_templates = len(small_table)
-small_data = zip(small_table.get_column(column1), small_table.get_column(column2))
+with stage('load'):
+	small_data = load_columns('data/tmpltbank.xml', (column1, column2))
+n_small_templates = len(small_data[0])
 
 # Create fill area (paint low chirp mass area black and skip drawing points there
 # in order to create a smaller PDF file
@@ -36,21 +38,24 @@ fill_max_mchirp = (fill_mtotal - 1) ** (3./5) * fill_mtotal ** (-1./5)
 #fill_min_mtotal = 2 ** (6./5) * fill_mchirp
 #fill_max_mtotal = soln(fill_mchirp)
 
-big_table = lsctables.table.get_table(
-	utils.load_filename('data/tmpltbank-pruned.xml'),
-	lsctables.SnglInspiralTable.tableName
-)
-n_big_templates = len(big_table)
-big_data = [x for x in zip(big_table.get_column(column1), big_table.get_column(column2)) if x not in small_data]
+with stage('load'):
+	big_data = load_columns('data/tmpltbank-pruned.xml', (column1, column2))
+n_big_templates = len(big_data[0])
+with stage('setdiff'):
+	big_data = setdiff_rows(big_data, small_data)
 #big_data2 = [x for x in big_data if x[0] >= max_big_mchirp]
 
-small_data = zip(*small_data)
-big_data = zip(*big_data)
+with stage('index'):
+	small_index = BankIndex(*small_data)
 
-def foo():
+def foo(rectangle=None):
 	pylab.fill_betweenx(fill_mtotal, fill_min_mchirp, fill_max_mchirp, edgecolor='0.6', facecolor='0.6')
 	#pylab.plot(big_data[0], big_data[1], ',k', markersize=0.01)
-	pylab.plot(small_data[0], small_data[1], ',k')
+	# Draw only the templates within the axes limits, as a raster with one
+	# cell per pixel
+	i = small_index.rectangle(*rectangle) if rectangle else slice(None)
+	with stage('raster'):
+		density_raster(pylab.gca(), small_data[0][i], small_data[1][i], dpi=300, binary=True)
 	#pylab.fill_between(fill_mchirp, fill_min_mtotal, fill_max_mtotal, edgecolor='none', facecolor='k')
 	#pylab.fill_betweenx(fill_mtotal, fill_min_mchirp, fill_max_mchirp, edgecolor='none', facecolor='0.2')
 	#pylab.axvspan(1.1955, 1.2045, alpha=0.6, facecolor='white', edgecolor='k')
@@ -70,13 +75,17 @@ ax = pylab.gca()
 ax.annotate(r'$1.1955 \, \leq \, \mathcal{M}/M_\odot \, \leq \, 1.2045$', xy=(1.225, 2.7), xycoords='data', xytext=(-4, -20), textcoords='offset points', arrowprops={'arrowstyle':'->'})
 axins = zoomed_inset_axes(ax, 8, loc=7)
 #pylab.plot(big_data[0], big_data[1], ',', color='0.6')
-foo()
-axins.set_ylim(2.7, 3.0)
-axins.set_xlim(1.14, 1.26)
+inset_xlim = (1.14, 1.26)
+inset_ylim = (2.7, 3.0)
+axins.set_ylim(*inset_ylim)
+axins.set_xlim(*inset_xlim)
+foo(inset_xlim + inset_ylim)
 axins.get_xaxis().set_major_locator(ticker.MultipleLocator(0.05))
 axins.get_yaxis().set_major_locator(ticker.MultipleLocator(0.1))
 #axins.set_title('%d templates' % n_small_templates)
 mark_inset(ax, axins, loc1=2, loc2=4, fc="none", ec="0.2")
 
-pylab.savefig(sys.argv[1], transparent=True)
+with stage('savefig'):
+	pylab.savefig(sys.argv[1], transparent=True)
+report(sys.argv[1])
 pylab.close()
@@ -1,8 +1,12 @@
 #!/usr/bin/env python
 
 import sys
-from pylal.xlal import constants
-from pylab import *
+from inspiral import isco_frequency, chirp_time
+from plotutil import headless
+from stages import stage, report
+with stage('import'):
+	headless()
+	from pylab import *
 
 # Component mass 1 in M_sun
 m1 = 1.4
@@ -10,20 +14,11 @@ m1 = 1.4
 # Component mass 2 in M_sun
 m2 = 1.4
 
-# Total mass in M_sun
-M = m1 + m2
-
-# Chirp mass
-Mchirp = (m1 * m2) ** 0.6 * M ** -0.2
-
 # ISCO frequency in Hz
-fISCO = 4400. / M
-
-def freq_for_time(t):
-	return (t / (5 * Mchirp * constants.LAL_MTSUN_SI)) ** (-3./8) / (8 * pi * Mchirp * constants.LAL_MTSUN_SI)
+fISCO = isco_frequency(m1, m2)
 
 def time_for_freq(f):
-	return 5 * (8 * pi) ** (-8./3) * (Mchirp * constants.LAL_MTSUN_SI) ** (-5./3) * f ** (-8./3)
+	return chirp_time(m1, m2, f)
 
 fig_width = 3.35
 fig_height = 2.75
@@ -52,4 +47,6 @@ xticks( (1, 10, 20, 30, 40, 100), ('1 Hz', '10 Hz', '20', '30', '40', '100'))
 
 title(r'(d) Inspiral duration vs. $f_\mathrm{low}$')
 plt.subplots_adjust(bottom=0.45/fig_height,top=1-0.25/fig_height,left=0.75/fig_width,right=(2.4+0.75)/fig_width)
-savefig(sys.argv[1])
+with stage('savefig'):
+	savefig(sys.argv[1])
+report(sys.argv[1])
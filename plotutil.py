@@ -0,0 +1,138 @@
+"""
+Draw dense data in figures at the resolution at which it will be seen.
+
+Curves are reduced with the largest-triangle-three-buckets (LTTB) algorithm
+to a few points per horizontal pixel of the axes, taking logarithmic axes
+into account, so that a spectrum with 10^5 samples costs no more to render
+or store than one with 10^3. Scatter data is binned into a raster image with
+one cell per pixel. Both need the axes' size, scales and limits, so set
+those before drawing.
+
+This module does not import matplotlib itself. Scripts call headless() just
+before they import pylab, and import it only once they start drawing, so
+that the tables that they print do not wait for it.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('headless', 'lttb', 'axes_pixels', 'plot_curve', 'density_raster')
+
+import numpy
+
+
+def headless():
+	"""Select matplotlib's non-interactive Agg backend, which needs no
+	display, whatever the matplotlibrc in the working directory says. Call
+	before importing pylab."""
+	import matplotlib
+	matplotlib.use('agg')
+
+
+def lttb(x, y, num_buckets, logx=False, logy=False):
+	"""Indices of at most num_buckets + 2 points of the curve (x, y), with x
+	increasing, chosen by largest-triangle-three-buckets. The range of x
+	(or of log x, if logx) is divided into num_buckets buckets of equal
+	width, and from each non-empty bucket the point is kept that forms the
+	largest triangle with the point kept from the previous bucket and the
+	mean of the next one. The first and last points are always kept. Points
+	that cannot be drawn on log axes are dropped."""
+	x = numpy.asarray(x, dtype=float)
+	y = numpy.asarray(y, dtype=float)
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		tx = numpy.log10(x) if logx else x
+		ty = numpy.log10(y) if logy else y
+	valid = numpy.nonzero(numpy.isfinite(tx) & numpy.isfinite(ty))[0]
+	if len(valid) <= num_buckets + 2:
+		return valid
+	tx = tx[valid]
+	ty = ty[valid]
+
+	# Interior points, grouped into buckets of equal width
+	edges = numpy.linspace(tx[0], tx[-1], num_buckets + 1)
+	bucket = numpy.clip(numpy.searchsorted(edges, tx[1:-1], 'right') - 1, 0, num_buckets - 1)
+	starts = 1 + numpy.searchsorted(bucket, numpy.arange(num_buckets))
+	stops = numpy.append(starts[1:], len(tx) - 1)
+	occupied = numpy.nonzero(stops > starts)[0]
+	starts = starts[occupied]
+	stops = stops[occupied]
+
+	# Mean of each bucket, and of the last point as a final bucket
+	counts = stops - starts
+	mean_x = numpy.append(numpy.add.reduceat(tx[1:-1], starts - 1) / counts, tx[-1])
+	mean_y = numpy.append(numpy.add.reduceat(ty[1:-1], starts - 1) / counts, ty[-1])
+
+	kept = [0]
+	for i, (start, stop) in enumerate(zip(starts, stops)):
+		ax, ay = tx[kept[-1]], ty[kept[-1]]
+		px, py = tx[start:stop], ty[start:stop]
+		area = numpy.abs((ax - mean_x[i + 1]) * (py - ay) - (ax - px) * (mean_y[i + 1] - ay))
+		kept.append(start + int(numpy.argmax(area)))
+	kept.append(len(tx) - 1)
+	return valid[kept]
+
+
+def axes_pixels(ax, dpi=None):
+	"""Width and height of the axes ax in pixels at dpi dots per inch (by
+	default, the figure's), where they will be drawn: with their aspect
+	ratio and axes locator, if any, applied."""
+	if dpi is None:
+		dpi = ax.figure.dpi
+	locator = ax.get_axes_locator()
+	canvas = ax.figure.canvas
+	if locator is not None and hasattr(canvas, 'get_renderer'):
+		# Axes with a locator, such as zoomed insets, are only put in their
+		# place when they are drawn; until then their position is their
+		# parent's.
+		bbox = locator(ax, canvas.get_renderer())
+	else:
+		if locator is not None:
+			canvas.draw()
+		ax.apply_aspect()
+		bbox = ax.get_position()
+	width, height = ax.figure.get_size_inches()
+	return int(numpy.ceil(bbox.width * width * dpi)), int(numpy.ceil(bbox.height * height * dpi))
+
+
+def plot_curve(ax, x, y, points_per_pixel=2, dpi=None, **kwargs):
+	"""Like ax.plot(x, y, **kwargs), but with the curve clipped to the x
+	limits of the axes and reduced by lttb to about points_per_pixel points
+	per pixel of width."""
+	x = numpy.asarray(x, dtype=float)
+	y = numpy.asarray(y, dtype=float)
+	order = numpy.argsort(x, kind='mergesort')
+	x = x[order]
+	y = y[order]
+	# Keep one point beyond each side so that lines run off the edges
+	x_min, x_max = sorted(ax.get_xlim())
+	start = max(0, numpy.searchsorted(x, x_min, 'left') - 1)
+	stop = numpy.searchsorted(x, x_max, 'right') + 1
+	x = x[start:stop]
+	y = y[start:stop]
+	width, height = axes_pixels(ax, dpi)
+	keep = lttb(x, y, points_per_pixel * width,
+		logx=ax.get_xscale() == 'log', logy=ax.get_yscale() == 'log')
+	return ax.plot(x[keep], y[keep], **kwargs)
+
+
+def density_raster(ax, x, y, dpi=None, binary=False, cmap='Greys', **kwargs):
+	"""Draw the points (x, y) within the limits of the linear axes ax as an
+	image with one cell per pixel, shaded by the number of points in each
+	cell. If binary, every cell holding any points is drawn in the darkest
+	color, like a plot of single-pixel markers. Empty cells are transparent.
+	Extra keyword arguments go to ax.imshow."""
+	if ax.get_xscale() != 'linear' or ax.get_yscale() != 'linear':
+		raise ValueError('density rasters need linear axes')
+	x_lim = ax.get_xlim()
+	y_lim = ax.get_ylim()
+	width, height = axes_pixels(ax, dpi)
+	counts, x_edges, y_edges = numpy.histogram2d(
+		numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float),
+		bins=(width, height), range=(sorted(x_lim), sorted(y_lim)))
+	if binary:
+		counts = (counts > 0).astype(float)
+		kwargs.setdefault('vmin', 0.)
+		kwargs.setdefault('vmax', 1.)
+	image = ax.imshow(numpy.ma.masked_equal(counts.T, 0), cmap=cmap,
+		extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+		origin='lower', aspect='auto', interpolation='nearest', **kwargs)
+	ax.set_xlim(x_lim)
+	ax.set_ylim(y_lim)
+	return image
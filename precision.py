@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Floating point precision of the large-array computations.
+
+The mock noise of mock_noise, the moments of snr.power_law_moments and the
+accumulated SNR of snr.accumulated_snr take a precision argument, 'double'
+(float64, the default) or 'single' (float32); the scripts that use them
+pass on default_precision, which is read from the environment variable
+LLOID_PRECISION. Single precision halves the memory traffic of the bulk
+elementwise work, but not everything can be done in it:
+
+	- Reductions such as cumulative sums accumulate in float64, with cumsum.
+	- PSDs of order 1e-46 are below the smallest float32, so they are scaled
+	  to order unity first and the scale is applied in float64 afterwards.
+	- Recursive filters with poles close to the unit circle amplify rounding
+	  errors by their gain, so mock_noise runs those branches in float64.
+
+Run this module as a script to compare every single precision computation
+with its double precision reference; it exits with status 1 if any error
+exceeds its tolerance.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('precisions', 'default_precision', 'working_dtype', 'cumsum',
+	'Validation', 'validate')
+
+from collections import namedtuple
+import os
+import numpy
+
+precisions = {'double': numpy.float64, 'single': numpy.float32}
+
+
+def working_dtype(precision='double'):
+	"""NumPy dtype of the precision 'double' or 'single'."""
+	try:
+		return numpy.dtype(precisions[precision])
+	except KeyError:
+		raise ValueError('precision must be one of %s, not %r' % (', '.join(sorted(precisions)), precision))
+
+
+default_precision = os.environ.get('LLOID_PRECISION', 'double')
+working_dtype(default_precision)
+
+
+def cumsum(x, axis=-1):
+	"""Cumulative sum of x along axis, accumulated and returned in float64
+	whatever the dtype of x."""
+	return numpy.cumsum(x, axis=axis, dtype=numpy.float64)
+
+
+Validation = namedtuple('Validation', 'name error tolerance')
+Validation.__doc__ = """Result of validate.
+
+name: name of the computation
+error: largest relative difference between its result in the precision
+	under test and in double precision
+tolerance: largest acceptable error"""
+
+
+def _relative_error(value, reference):
+	value = numpy.asarray(value, dtype=float)
+	reference = numpy.asarray(reference, dtype=float)
+	nonzero = reference != 0
+	return float(numpy.max(numpy.abs(value[nonzero] / reference[nonzero] - 1)))
+
+
+def _power_law_moments(precision):
+	from noisemodels import asds
+	from snr import power_law_moments
+	f, asd = asds['zero det., high power'].T
+	f_out = numpy.logspace(numpy.log10(2.), numpy.log10(1570.), 100000)
+	return power_law_moments(f, asd, (-7./3, -4./3, -1./3), 2., 1570., f_out, precision)[1]
+
+
+def _accumulated_snr(precision):
+	from noisemodels import psds
+	from snr import accumulated_snr
+	f = numpy.linspace(10., 1570., 10000)
+	return accumulated_snr(f, psds['zero det., high power'].asd(f), precision)
+
+
+def _mock_noise_psd(precision):
+	from mock_noise import NoiseGenerator, WelchPSD, rate
+	noise = NoiseGenerator(rate, random_state=0, precision=precision)
+	welch = WelchPSD(rate, rate, noverlap=rate // 4, precision=precision)
+	for i in range(64):
+		welch.update(noise.next_block())
+	band = (welch.frequencies >= 10) & (welch.frequencies <= 5000)
+	return welch.psd[band]
+
+
+_checks = (
+	('power_law_moments', _power_law_moments, 1e-5),
+	('accumulated_snr', _accumulated_snr, 1e-5),
+	('mock_noise_psd', _mock_noise_psd, 1e-5),
+)
+
+
+def validate(precision='single'):
+	"""Run each computation in the given precision and in double precision,
+	and return a list of Validations."""
+	working_dtype(precision)
+	return [Validation(name, _relative_error(func(precision), func('double')), tolerance)
+		for name, func, tolerance in _checks]
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	import sys
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options]', option_list = [
+		Option("--precision", default="single",
+			help="precision to validate against double precision (default: %default)"),
+	]).parse_args()
+	if len(args) > 0:
+		raise ValueError("Too many arguments")
+
+	failed = False
+	for result in validate(opts.precision):
+		ok = result.error <= result.tolerance
+		failed = failed or not ok
+		sys.stdout.write('%-18s %10.3g  (tolerance %.0e)  %s\n' % (
+			result.name, result.error, result.tolerance, 'ok' if ok else 'FAILED'))
+	if failed:
+		sys.exit(1)
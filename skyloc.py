@@ -0,0 +1,151 @@
+"""
+Sky localization by timing triangulation for arbitrary detector networks,
+vectorized over sky positions and times before coalescence.
+
+Each detector measures the arrival time of the signal with an uncertainty
+sigma_t = 1 / (2 pi rho sigma_f), where rho is its SNR and sigma_f the
+effective bandwidth of the signal accumulated so far (Fairhurst 2009). A
+source in direction n reaches detector i at t_0 - r_i . n / c. The Fisher
+matrix of the arrival times for the direction, with the unknown t_0
+marginalized out, is
+
+	M = sum_i w_i b_i b_i^T - (sum_i w_i b_i)(sum_i w_i b_i)^T / sum_i w_i
+
+with b_i = r_i / c and w_i = 1 / sigma_t,i^2. Projected onto the plane of
+the sky at n, it gives the area of the 90% confidence region,
+A(90%) = 2 pi ln(10) / sqrt(det M_n) steradians. For two detectors M has
+rank 1 and the area is infinite: they constrain only a ring.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('detectors', 'sky_grid', 'timing_moments', 'timing_uncertainty',
+	'localization_area')
+
+import numpy
+from inspiral import LAL_C
+from snr import power_law_moments
+
+# Earth-fixed positions of detector vertices in meters, as in LAL
+detectors = {
+	'H1': (-2.16141492636e+06, -3.83469517889e+06, 4.60035022664e+06),
+	'L1': (-7.42760447238e+04, -5.49628371971e+06, 3.22425701744e+06),
+	'V1': (4.54637409900e+06, 8.42989697626e+05, 4.37857696241e+06),
+	'K1': (-3.777336024e+06, 3.484898411e+06, 3.765313697e+06),
+}
+
+
+def sky_grid(n):
+	"""n unit vectors spread evenly over the sphere (a Fibonacci lattice),
+	as an (n, 3) array. Each represents an equal area of 4 pi / n sr."""
+	i = numpy.arange(n) + 0.5
+	z = 1 - 2 * i / n
+	phi = numpy.pi * (1 + 5**0.5) * i
+	r = numpy.sqrt(1 - z**2)
+	return numpy.column_stack((r * numpy.cos(phi), r * numpy.sin(phi), z))
+
+
+def timing_moments(f, asd, f_low, f_high, f_out):
+	"""Fraction of the SNR accumulated from f_low up to each frequency in
+	f_out, and the effective bandwidth sigma_f in Hz of the signal up to
+	there, for the PSD S = asd**2 sampled at frequencies f. Both are NaN at
+	f_low."""
+	f_out = numpy.append(numpy.asarray(f_out, dtype=float), f_high)
+	_, (rho2, f1, f2) = power_law_moments(f, asd, (-7./3, -4./3, -1./3), f_low, f_high, f_out)
+	rho2, f1, f2, rho2_total = rho2[:-1], f1[:-1], f2[:-1], rho2[-1]
+	with numpy.errstate(invalid='ignore', divide='ignore'):
+		sigma_f = numpy.sqrt(f2 / rho2 - (f1 / rho2)**2)
+	return numpy.where(rho2 > 0, numpy.sqrt(rho2 / rho2_total), numpy.nan), sigma_f
+
+
+def timing_uncertainty(f, asd, f_low, f_high, f_out, final_snr):
+	"""Arrival time uncertainty in seconds at each frequency in f_out of a
+	signal that will reach final_snr at f_high, for the PSD S = asd**2
+	sampled at frequencies f."""
+	fraction, sigma_f = timing_moments(f, asd, f_low, f_high, f_out)
+	return 1. / (2 * numpy.pi * final_snr * fraction * sigma_f)
+
+
+def localization_area(positions, sigma_t, directions, chunk_size=4096):
+	"""Area in deg^2 of the 90% confidence region of timing triangulation.
+
+	positions: (D, 3) detector positions in meters, e.g. values of detectors
+	sigma_t: (D, T) arrival time uncertainties in seconds of each detector at
+		each of T times; broadcast against (D, 1)
+	directions: (N, 3) unit vectors toward the source, in the same frame as
+		positions, e.g. from sky_grid
+	chunk_size: number of directions processed at once, which bounds the
+		memory used
+
+	Returns an (N, T) array, infinite where the network constrains the
+	direction only to a ring, as with two detectors."""
+	b = numpy.asarray(positions, dtype=float) / LAL_C
+	sigma_t = numpy.asarray(sigma_t, dtype=float)
+	if sigma_t.ndim == 1:
+		sigma_t = sigma_t[:, numpy.newaxis]
+	directions = numpy.asarray(directions, dtype=float)
+	if len(b) != len(sigma_t):
+		raise ValueError('need one row of timing uncertainties per detector')
+
+	# M is a sum over baselines, M = sum_p c_p e_p e_p^T with e_p = b_i - b_j
+	# and c_p = w_i w_j / sum_k w_k for each pair of detectors i < j. Its
+	# projection onto the plane of the sky at n then has the determinant
+	# sum_{p<q} c_p c_q ((e_p x e_q) . n)^2 (Cauchy-Binet) and the trace
+	# sum_p c_p (|e_p|^2 - (e_p . n)^2). Unlike the determinant of the
+	# projected M, this is exactly zero for a single baseline.
+	w = sigma_t**-2
+	i, j = numpy.triu_indices(len(b), 1)
+	e = b[i] - b[j]                                   # (P, 3)
+	c = w[i] * w[j] / w.sum(axis=0)                   # (P, T)
+	p, q = numpy.triu_indices(len(e), 1)
+	g = numpy.cross(e[p], e[q])                       # (Q, 3)
+	cc = c[p] * c[q]                                  # (Q, T)
+
+	result = numpy.empty((len(directions), len(w.T)))
+	for start in range(0, len(directions), chunk_size):
+		n = directions[start:start + chunk_size]
+		det = numpy.dot(numpy.dot(n, g.T)**2, cc)
+		trace = numpy.dot(numpy.sum(e**2, axis=1) - numpy.dot(n, e.T)**2, c)
+		# Treat determinants within rounding error of zero as zero.
+		det[det <= numpy.finfo(float).eps * trace**2] = 0
+		with numpy.errstate(divide='ignore'):
+			result[start:start + chunk_size] = 2 * numpy.pi * numpy.log(10) / numpy.sqrt(det)
+	return result * (180 / numpy.pi)**2
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	import sys
+	from noisemodels import asds
+	from inspiral import chirp_mass, isco_frequency, time_to_freq
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options]', option_list = [
+		Option("--network", default="H1,L1,V1",
+			help="comma-separated detectors (default: %default)"),
+		Option("--noise-model", default="zero det., high power",
+			help="name of noise model in noisemodels.asds, used for every detector (default: %default)"),
+		Option("--final-snr", type="float", default=10.,
+			help="SNR of the signal in each detector at coalescence (default: %default)"),
+		Option("--flow", type="float", default=10., metavar="Hz",
+			help="low frequency cutoff (default: %default)"),
+		Option("--num-directions", type="int", default=10000,
+			help="number of sky positions (default: %default)"),
+	]).parse_args()
+	if len(args) > 0:
+		raise ValueError("Too many arguments")
+
+	m1 = m2 = 1.4
+	f_high = isco_frequency(m1, m2)
+	times = numpy.array([25., 10., 1., 0.])
+	f_out = numpy.minimum(time_to_freq(chirp_mass(m1, m2), numpy.maximum(times, 1e-6)), f_high)
+	f, asd = asds[opts.noise_model].T
+	names = opts.network.split(',')
+	sigma_t = timing_uncertainty(f, asd, opts.flow, f_high, f_out, opts.final_snr)
+	area = localization_area([detectors[name] for name in names],
+		numpy.tile(sigma_t, (len(names), 1)), sky_grid(opts.num_directions))
+	# Two-detector networks, or directions in which the baselines are
+	# degenerate, give infinite areas, for which numpy.percentile returns
+	# nan; take nearest-rank percentiles of the sorted areas instead, which
+	# are infinite when more than that fraction of the sky is.
+	sys.stdout.write("time (s)  median A(90%) (deg^2)  90th percentile  finite (%)\n")
+	for t, a in zip(times, area.T):
+		a = numpy.sort(a)
+		median, p90 = (a[int(numpy.ceil(q * len(a))) - 1] for q in (0.5, 0.9))
+		sys.stdout.write("%8g  %21.1f  %15.1f  %10.1f\n" % (t, median, p90, 100. * numpy.mean(numpy.isfinite(a))))
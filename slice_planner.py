@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Place LLOID time slices by minimizing the computational cost of running them
+with lloid.LLOIDFilter, subject to a latency ceiling.
+
+Time is measured backwards from the moment the signal reaches f_high. A
+slice [begin, end) must be sampled at a power of 2 rate high enough that the
+signal frequency at its begin time, its latest and highest-frequency point,
+lies in the passband of the resampling kernel at that rate, i.e. below the
+fraction rolloff of the Nyquist frequency. Candidate boundaries are the
+times at which the minimum rate halves, plus log-spaced times in between.
+Each boundary is rounded up to a whole number of samples at the rate of the
+slice that begins there. Dynamic programming over (boundary, rate) pairs
+then finds the cheapest plan.
+
+The filtering, reconstruction and accumulation of each slice are charged as
+in the first sum of the paper's Equation (lloid-flops). The resampling is
+not: the equation charges one decimator and one interpolator per distinct
+rate, but lloid.LLOIDFilter decimates and interpolates by 2 through every
+power of 2 rate from the highest to the lowest, whether or not a slice uses
+it, and the planner charges what the filter does. With a kernel of N taps
+at the higher rate f, a polyphase decimator and each of the M polyphase
+interpolators by 2 cost N f flops. Each such pair of stages adds N - 1
+samples of delay at the higher of its two rates, so a slice at the k-th
+rate below the highest, beginning at time b, forces a latency of at least
+((2^k - 1) (N - 1) / f^0 - b).
+
+Run this module as a script to check plans against lloid.LLOIDFilter: a
+bank of chirps is cut into the planned slices, without rank reduction, and
+filtered through it, and the result is compared with direct convolution.
+The script exits with status 1 if they differ by more than a tolerance or
+if the filter's latency is not that of the plan.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('SlicePlan', 'plan_time_slices', 'check_plan')
+
+from collections import namedtuple
+import numpy
+from inspiral import chirp_time, chirp_frequency
+
+
+SlicePlan = namedtuple('SlicePlan', 'slices costs resample_cost cost latency')
+SlicePlan.__doc__ = """Result of plan_time_slices.
+
+slices: time slice table with fields 'rate', 'begin' and 'end', ordered by
+	begin time like that of gstlal.templates.time_slices
+costs: per-slice cost in flops with fields 'filter' (orthogonal filters),
+	'reconstruction' and 'accumulation'
+resample_cost: cost in flops of all decimation and interpolation stages
+cost: total cost in flops
+latency: latency in seconds of the plan when run by lloid.LLOIDFilter with
+	the same resampling kernel"""
+
+slice_dtype = [('rate', int), ('begin', float), ('end', float)]
+cost_dtype = [('filter', float), ('reconstruction', float), ('accumulation', float)]
+
+
+def _ceil_pow2(x):
+	return 2 ** numpy.ceil(numpy.log2(x)).astype(int)
+
+
+_rolloffs = {}
+
+
+def _rolloff(kernel, tolerance=0.01):
+	"""Edge of the passband of a resampling kernel for a factor of 2, as a
+	fraction of the Nyquist frequency of the lower rate: the lowest
+	frequency at which its gain differs from unity by more than tolerance."""
+	key = (tuple(kernel), tolerance)
+	try:
+		return _rolloffs[key]
+	except KeyError:
+		gain = numpy.abs(numpy.fft.rfft(kernel, 1 << 14))
+		f = numpy.linspace(0., 2., len(gain))
+		result = _rolloffs[key] = f[numpy.argmax(numpy.abs(gain - 1) > tolerance)]
+		return result
+
+
+def plan_time_slices(m1, m2, f_low, f_high, max_latency=numpy.inf,
+		resample_kernel_length=65, num_templates=1, rank_reduction=1.,
+		max_samples=None, num_candidates=64, order=0):
+	"""Plan time slices for a template of component masses m1 and m2 in
+	M_sun from f_low to f_high in Hz.
+
+	max_latency: latency ceiling in seconds
+	resample_kernel_length: number of taps of the decimation and
+		interpolation kernels, as in lloid.LLOIDFilter
+	num_templates: number of templates M filtered together
+	rank_reduction: ratio of the number of basis filters per slice to M
+	max_samples: if given, the most samples a slice may have, to keep the
+		matrices that enter the SVD manageable
+	num_candidates: number of log-spaced candidate boundaries added to the
+		rate transitions
+	order: PN order of the time-frequency relation, as in
+		inspiral.chirp_time
+
+	Returns a SlicePlan. Raises ValueError if no plan meets max_latency or
+	if lloid.resample_kernel rejects the kernel length."""
+	from lloid import resample_kernel
+	kernel = resample_kernel(resample_kernel_length)
+	rolloff = _rolloff(kernel)
+	t_high = chirp_time(m1, m2, f_high, order)
+	t_end = chirp_time(m1, m2, f_low, order) - t_high
+	M = float(num_templates)
+	L = rank_reduction * M
+	N = len(kernel)
+	# Delay of one decimation and one interpolation by 2, in samples at the
+	# higher rate
+	resample_delay = N - 1
+
+	def min_rate(t):
+		# Lowest power of 2 rate whose resampling passband holds the signal
+		# at time t
+		return _ceil_pow2(2 * chirp_frequency(m1, m2, numpy.asarray(t) + t_high, order) / rolloff)
+
+	base_rate = int(min_rate(0.))
+	rates = base_rate // 2 ** numpy.arange(int(numpy.log2(base_rate / min_rate(t_end))) + 1)
+
+	# Candidate boundaries: rate transitions and log-spaced times, each
+	# rounded up to the sample grid of the slice that begins there
+	raw = [0., t_end]
+	raw += list(chirp_time(m1, m2, rolloff * rates[1:] / 2., order) - t_high)
+	raw += list(numpy.logspace(numpy.log10(1. / base_rate), numpy.log10(t_end), num_candidates))
+	raw = numpy.asarray(raw)
+	raw = raw[(raw >= 0) & (raw <= t_end)]
+	raw_rates = min_rate(raw)
+	times = numpy.ceil(raw * raw_rates) / raw_rates
+	times, index = numpy.unique(times, return_index=True)
+	# Highest level (index into rates) usable by a slice beginning at each time
+	max_level = numpy.log2(base_rate / raw_rates[index].astype(float)).astype(int)
+	t_end = times[-1]
+	K = len(times)
+	A = len(rates)
+
+	# Cumulative resampling cost of all stages from the base rate down to
+	# each level: one decimation and M interpolations per stage
+	level_cost = numpy.zeros(A)
+	level_cost[1:] = numpy.cumsum((1 + M) * N * rates[:-1])
+
+	# A level is allowed for a slice beginning at time b if it satisfies the
+	# latency ceiling; higher levels need a later beginning
+	level_latency = (2 ** numpy.arange(A) - 1) * resample_delay / base_rate
+	allowed = ((level_latency[numpy.newaxis, :] - times[:, numpy.newaxis] <= max_latency)
+		& (numpy.arange(A)[numpy.newaxis, :] <= max_level[:, numpy.newaxis]))
+
+	# best[i, a]: cheapest cost of slices covering [0, times[i]), plus the
+	# resampling stages down to level a, where a is the level of the slice
+	# beginning at times[i]
+	best = numpy.empty((K, A))
+	best.fill(numpy.inf)
+	best[0, 0] = 0.
+	back = numpy.zeros((K, A, 2), dtype=int)
+	best_end = numpy.inf
+	end_back = None
+	levels = numpy.arange(A)
+	for j in range(1, K):
+		# Cost of a slice [times[i], times[j]) at each level, for every i < j
+		samples = (times[j] - times[:j, numpy.newaxis]) * rates[numpy.newaxis, :]
+		slice_cost = (2 * samples * L + 2 * M * L + M) * rates[numpy.newaxis, :]
+		if max_samples is not None:
+			slice_cost[samples > max_samples] = numpy.inf
+		total = best[:j] + slice_cost
+		if j == K - 1:
+			i, a = numpy.unravel_index(numpy.argmin(total), total.shape)
+			best_end, end_back = total[i, a], (i, a)
+			break
+		# The next slice begins at times[j] at a level no higher than the
+		# one before it; pay for the resampling stages in between.
+		for b in levels[allowed[j]]:
+			candidates = total[:, :b + 1] + (level_cost[b] - level_cost[:b + 1])
+			i, a = numpy.unravel_index(numpy.argmin(candidates), candidates.shape)
+			best[j, b] = candidates[i, a]
+			back[j, b] = i, a
+
+	if not numpy.isfinite(best_end):
+		raise ValueError('no time slice plan meets a latency of %g s' % max_latency)
+
+	# Walk back through the slices
+	rows = []
+	j = K - 1
+	i, a = end_back
+	while True:
+		rows.append((rates[a], times[i], times[j]))
+		if i == 0:
+			break
+		j, (i, a) = i, back[i, a]
+	slices = numpy.array(rows[::-1], dtype=slice_dtype)
+
+	samples = (slices['end'] - slices['begin']) * slices['rate']
+	costs = numpy.empty(len(slices), dtype=cost_dtype)
+	costs['filter'] = 2 * samples * L * slices['rate']
+	costs['reconstruction'] = 2 * M * L * slices['rate']
+	costs['accumulation'] = M * slices['rate']
+	num_levels = int(numpy.log2(base_rate / slices['rate'].min())) + 1
+	resample_cost = level_cost[num_levels - 1]
+	latency = max(0., numpy.max(level_latency[
+		numpy.log2(base_rate / slices['rate'].astype(float)).astype(int)] - slices['begin']))
+	return SlicePlan(slices, costs, resample_cost, best_end, latency)
+
+
+def _chirp_templates(m1, m2, f_high, rate, length, order=0):
+	"""Cosine and sine phase chirps of component masses m1 and m2 in M_sun,
+	with amplitudes proportional to f^(-7/6), as (2, length) templates
+	sampled at rate; column k is k / rate seconds before the chirp reaches
+	f_high. Each is normalized to unit sum of squares."""
+	t = numpy.arange(length) / float(rate)
+	f = chirp_frequency(m1, m2, t + chirp_time(m1, m2, f_high, order), order)
+	phase = -2 * numpy.pi * numpy.cumsum(f) / rate
+	templates = f**(-7./6) * numpy.array([numpy.cos(phase), numpy.sin(phase)])
+	return templates / numpy.sqrt(numpy.sum(templates**2, axis=1))[:, numpy.newaxis]
+
+
+def check_plan(m1, m2, f_low, f_high, resample_kernel_length=65, seed=0, **kwargs):
+	"""Plan time slices as by plan_time_slices, run a chirp through
+	lloid.LLOIDFilter with them, and compare with direct convolution.
+	Returns the SlicePlan, the relative RMS difference of the outputs, and
+	the latency of the filter in seconds."""
+	from scipy import signal
+	from lloid import LLOIDFilter, slice_templates
+	plan = plan_time_slices(m1, m2, f_low, f_high,
+		resample_kernel_length=resample_kernel_length, **kwargs)
+	rate = int(plan.slices['rate'].max())
+	n = int(round(plan.slices['end'].max() * rate))
+	templates = _chirp_templates(m1, m2, f_high, rate, n, kwargs.get('order', 0))
+	bases = [(matrix, numpy.eye(len(matrix)))
+		for matrix in slice_templates(templates, rate, plan.slices)]
+	filt = LLOIDFilter(plan.slices, bases, resample_kernel_length)
+	delay = int(round(filt.latency * rate))
+
+	x = numpy.random.RandomState(seed).randn(3 * n)
+	y = filt(x)[:, n + delay:]
+	expected = signal.fftconvolve(x[numpy.newaxis], templates, axes=1)[:, n:len(x) - delay]
+	error = numpy.sqrt(numpy.sum((y - expected)**2) / numpy.sum(expected**2))
+	return plan, error, filt.latency
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	import sys
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options]', option_list = [
+		Option("--tolerance", type="float", default=0.05,
+			help="largest acceptable relative RMS difference (default: %default)"),
+	]).parse_args()
+	if len(args) > 0:
+		raise ValueError("Too many arguments")
+
+	failed = False
+	for m1, m2, f_low, f_high, kwargs in (
+			(1.4, 1.4, 40., 1570., {}),
+			(1.4, 1.4, 40., 1570., {'resample_kernel_length': 33}),
+			(1.4, 1.4, 40., 1570., {'max_latency': 0.}),
+			(3., 3., 30., 700., {'order': 2})):
+		plan, error, latency = check_plan(m1, m2, f_low, f_high, **kwargs)
+		ok = error <= opts.tolerance and abs(latency - plan.latency) < 1e-9
+		failed = failed or not ok
+		sys.stdout.write('%g+%g Msun %g-%g Hz %-30s %d slices  error %.4f  latency %g s (planned %g s)  %s\n' % (
+			m1, m2, f_low, f_high, kwargs, len(plan.slices), error, latency, plan.latency,
+			'ok' if ok else 'FAILED'))
+	if failed:
+		sys.exit(1)
@@ -0,0 +1,189 @@
+"""
+Accumulated SNR, fractional SNR and horizon distance of inspiral signals,
+evaluated for many component masses, noise models and low frequency cutoffs
+at once.
+
+The noise-weighted integrand f^(-7/3) / S(f) does not depend on the masses,
+so snr_sweep integrates it once per noise model. The masses enter only
+through the upper limit of integration, f_ISCO, and the overall amplitude of
+the horizon distance. Everything else is a broadcast over (mass, PSD,
+f_low).
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('SNRSweep', 'snr_sweep', 'power_law_moments', 'accumulated_snr')
+
+from collections import namedtuple
+import numpy
+from inspiral import chirp_mass, isco_frequency, horizon
+from precision import working_dtype, cumsum
+
+
+SNRSweep = namedtuple('SNRSweep', 'f accum_snr horizon fractional_snr')
+SNRSweep.__doc__ = """Result of snr_sweep. With K mass pairs, P noise models,
+L low frequency cutoffs and F the length of the longest frequency grid:
+
+f: (P, F) frequency grids, padded with NaN
+accum_snr: (K, P, F) SNR accumulated from each frequency up to f_ISCO, as a
+	fraction of the SNR above f_ref; NaN outside [f_ref, f_ISCO]. None if
+	curves were not requested.
+horizon: (K, P, L) horizon distance in Mpc for each low frequency cutoff
+fractional_snr: (K, P, L) SNR above each low frequency cutoff, as a
+	fraction of the SNR above f_ref"""
+
+
+def _reverse_cumulative_integrals(psds):
+	"""Integrate f^(-7/3) / S(f) on each noise model's own grid, from each
+	sample up to the end of the grid, with the same left-endpoint rule as
+	plot_accum_snr.py. Return frequencies padded to a common length with +inf
+	and integrals with one extra trailing zero (the empty integral)."""
+	psds = [numpy.asarray(data, dtype=float) for data in psds]
+	n = max(len(data) for data in psds)
+	f = numpy.empty((len(psds), n))
+	f.fill(numpy.inf)
+	R = numpy.zeros((len(psds), n + 1))
+	for i, data in enumerate(psds):
+		ff, s = data.T
+		df = numpy.diff(ff)
+		df = numpy.concatenate((df, df[-1:]))
+		f[i, :len(ff)] = ff
+		R[i, :len(ff)] = numpy.cumsum((ff**(-7./3) / s**2 * df)[::-1])[::-1]
+	return f, R
+
+
+def _searchsorted_rows(f, values, side):
+	"""numpy.searchsorted applied to each row of the (P, F) array f. Return
+	an array of shape (P,) + values.shape."""
+	values = numpy.asarray(values, dtype=float)
+	return numpy.array([row.searchsorted(values, side) for row in f])
+
+
+def snr_sweep(psds, m1, m2, f_lows, f_ref=10., snr_threshold=8., curves=True):
+	"""Compute accumulated SNR curves, horizon distances and fractional SNRs
+	for every combination of mass pair, noise model and low frequency cutoff.
+
+	psds: sequence of (N, 2) arrays of frequency and ASD, as in
+		noisemodels.asds.values(); the grids need not agree
+	m1, m2: component masses in M_sun, broadcast against each other
+	f_lows: low frequency cutoffs in Hz
+	f_ref: low frequency cutoff of the reference SNR for fractions
+	snr_threshold: SNR at which the horizon distance is defined
+	curves: if false, skip the (K, P, F) accum_snr array
+
+	Returns an SNRSweep."""
+	m1, m2 = numpy.broadcast_arrays(
+		numpy.atleast_1d(numpy.asarray(m1, dtype=float)),
+		numpy.atleast_1d(numpy.asarray(m2, dtype=float)))
+	m1 = m1.ravel()
+	m2 = m2.ravel()
+	f_lows = numpy.atleast_1d(numpy.asarray(f_lows, dtype=float))
+	f, R = _reverse_cumulative_integrals(psds)
+	rows = numpy.arange(len(f))[:, numpy.newaxis]
+
+	# Indices of the first sample at or above each lower limit, and of the
+	# first sample above each f_ISCO: integrals are differences of R.
+	i_low = _searchsorted_rows(f, f_lows, 'left')                 # (P, L)
+	i_ref = _searchsorted_rows(f, f_ref, 'left')                  # (P,)
+	i_isco = _searchsorted_rows(f, isco_frequency(m1, m2), 'right')  # (P, K)
+	R_isco = R[rows, i_isco].T[:, :, numpy.newaxis]               # (K, P, 1)
+
+	I_low = numpy.maximum(R[rows, i_low][numpy.newaxis] - R_isco, 0)  # (K, P, L)
+	I_ref = numpy.maximum(R[rows[:, 0], i_ref][numpy.newaxis, :, numpy.newaxis] - R_isco, 0)
+
+	with numpy.errstate(invalid='ignore', divide='ignore'):
+		fractional_snr = numpy.sqrt(I_low / I_ref)
+	D = horizon(chirp_mass(m1, m2)[:, numpy.newaxis, numpy.newaxis],
+		4 * I_low, snr_threshold)
+
+	if curves:
+		index = numpy.arange(f.shape[1])
+		in_band = (index >= i_ref[:, numpy.newaxis]) & (index[numpy.newaxis] < i_isco.T[:, :, numpy.newaxis])
+		with numpy.errstate(invalid='ignore', divide='ignore'):
+			accum_snr = numpy.sqrt((R[numpy.newaxis, :, :-1] - R_isco) / I_ref)
+		accum_snr[~in_band] = numpy.nan
+	else:
+		accum_snr = None
+
+	f = numpy.where(numpy.isinf(f), numpy.nan, f)
+	return SNRSweep(f, accum_snr, D, fractional_snr)
+
+
+def power_law_moments(f, asd, exponents, f_low, f_high, f_out=None, precision='double'):
+	"""Cumulative frequency moments 4 int_{f_low}^{f} f'^p / S(f') df' of the
+	PSD S(f) = asd(f)**2, for each exponent p, without a fine frequency grid.
+
+	Between its samples the PSD is taken to be a power law, i.e. linearly
+	interpolated in log-log space, and each moment is integrated exactly over
+	every interval. Outside the sampled band the PSD is held constant, as
+	numpy.interp would do.
+
+	f, asd: frequency and amplitude spectral density samples
+	exponents: sequence of exponents p, e.g. (-7./3, -4./3, -1./3)
+	f_low, f_high: limits of integration in Hz
+	f_out: ascending frequencies in [f_low, f_high] at which to evaluate the
+		cumulative moments. Defaults to the PSD samples between the limits
+		and the limits themselves; a log-spaced grid of a few hundred
+		points is also adequate for smooth PSDs.
+	precision: 'double' or 'single', the precision of the integrals over
+		the intervals; the knots and their sums are always in float64
+
+	Returns f_out and an array of shape (len(exponents), len(f_out))."""
+	dtype = working_dtype(precision)
+	f = numpy.asarray(f, dtype=float)
+	log_f = numpy.log(f)
+	log_S = 2 * numpy.log(numpy.asarray(asd, dtype=float))
+	exponents = numpy.atleast_1d(numpy.asarray(exponents, dtype=float))[:, numpy.newaxis]
+
+	inner = f[(f > f_low) & (f < f_high)]
+	if f_out is None:
+		f_out = numpy.concatenate(([f_low], inner, [f_high]))
+	else:
+		f_out = numpy.asarray(f_out, dtype=float)
+	knots = numpy.union1d(numpy.union1d(f_out, inner), [f_low, f_high])
+
+	# Power law index of the PSD on each interval between knots
+	log_knots = numpy.log(knots)
+	log_S_knots = numpy.interp(log_knots, log_f, log_S)
+	log_r = numpy.diff(log_knots)
+	# Knots that differ by less than the precision of their logarithms
+	# bound empty intervals.
+	gamma = numpy.diff(log_S_knots) / numpy.where(log_r == 0, 1., log_r)
+
+	# int_{f_i}^{f_i+1} f^p / S(f) df
+	#     = f_i^(p+1) / S_i * log(r) * (r^k - 1) / (k log(r)),
+	# with r = f_i+1 / f_i and k = p + 1 - gamma; the last factor tends to 1
+	# as k log(r) tends to 0.
+	x = ((exponents + 1 - gamma) * log_r).astype(dtype)
+	with numpy.errstate(invalid='ignore', divide='ignore'):
+		factor = numpy.where(x == 0, dtype.type(1), numpy.expm1(x) / x)
+	log_amplitude = (exponents + 1) * log_knots[:-1] - log_S_knots[:-1]
+	# 1 / S(f) is far beyond the range of float32, so in single precision
+	# take out the largest amplitude of each moment, and put it back once
+	# the segments have been summed in float64.
+	if dtype == numpy.float64:
+		scale = numpy.zeros((len(exponents), 1))
+	else:
+		scale = log_amplitude.max(axis=1)[:, numpy.newaxis]
+	segments = 4 * numpy.exp((log_amplitude - scale).astype(dtype)) * log_r.astype(dtype) * factor
+
+	cumulative = numpy.zeros((len(exponents), len(knots)))
+	cumulative[:, 1:] = cumsum(segments, axis=1) * numpy.exp(scale)
+	return f_out, cumulative[:, knots.searchsorted(f_out)]
+
+
+def accumulated_snr(f, asd, precision='double'):
+	"""Square root of the cumulative sum of f^(-7/3) / asd^2 df, on the
+	evenly spaced frequencies f: the SNR accumulated from f[0] up to each
+	frequency, up to a constant factor. The sums are returned in float64.
+
+	In single precision, asd^2 is of order 1e-46, below the smallest
+	float32, so the integrand is evaluated with asd in units of its
+	minimum."""
+	dtype = working_dtype(precision)
+	f = numpy.asarray(f, dtype=float)
+	asd = numpy.asarray(asd, dtype=float)
+	df = f[1] - f[0]
+	if dtype == numpy.float64:
+		return cumsum(df * f**(-7./3) / asd**2)**.5
+	scale = asd.min()
+	integrand = dtype.type(df) * f.astype(dtype)**dtype.type(-7./3) / (asd / scale).astype(dtype)**2
+	return cumsum(integrand)**.5 / scale
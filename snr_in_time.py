@@ -1,40 +1,23 @@
 #!/usr/bin/python
+from stages import stage, report
 import numpy
-import pylab
-import scipy
-from scipy import interpolate
 import sys
+from inspiral import chirp_time
+from memo import memoize
+from noisemodels import PSD
+from precision import default_precision
+from snr import accumulated_snr
+from plotutil import headless
+with stage('import'):
+	headless()
+	import pylab
 
 #
-# Constants
+# cumulative fractional snr computed over f, from the asd sampled on f, in
+# the precision set by LLOID_PRECISION; memoized on disk
 #
 
-LAL_MTSUN_SI = 4.9254909500000001e-06
-PI = 3.14159265
-
-#
-# Mchirp
-#
-
-def mchirp(m1, m2):
-        return (m1 * m2)**.6 / (m1+m2)**.2
-
-#
-# cumulative fractional snr computed over f
-#
-
-def snr(f, asd):
-	df = f[1] - f[0]
-	out = numpy.cumsum(df * f**(-7./3) / asd(f)**2)**.5
-	return out# / out[-1]
-
-#
-# frequency to time relationship assuming 0PN 
-#
-
-def freq_to_time(Mc,f):
-	Mc = Mc * LAL_MTSUN_SI
-	return 5. * Mc / 256. * (PI * Mc * f) ** (-8./3.)
+snr = memoize(accumulated_snr, depends=('precision',))
 
 #
 # the number of events above fractional snr of SNR assuming number detectable
@@ -56,10 +39,8 @@ snrd = {}
 for i, (cfile, label) in enumerate(zip(['data/ZERO_DET_high_P.txt'], ['zero det'])):
 
 	# Load the data
-	A = numpy.loadtxt(cfile)
-
-	# interpolate the asd
-	asd = interpolate.interp1d(A[:,0], A[:,1])
+	with stage('load'):
+		psd = PSD.load(cfile)
 
 	# set up the frequency boundaries
 	fmin = 10.
@@ -69,7 +50,8 @@ for i, (cfile, label) in enumerate(zip(['data/ZERO_DET_high_P.txt'], ['zero det'
 	f = numpy.linspace(fmin, fmax, 10000)
 
 	# compute the snr on the frequency array
-	snrd[cfile] = snr(f, asd)
+	with stage('snr'):
+		snrd[cfile] = snr(f, psd.asd(f), default_precision)
 
 	# normalize all snrs to 'data/ZERO_DET_high_P.txt'
 	snr1 = snrd[cfile] / snrd['data/ZERO_DET_high_P.txt'][-1]
@@ -79,7 +61,7 @@ for i, (cfile, label) in enumerate(zip(['data/ZERO_DET_high_P.txt'], ['zero det'
 	snrminus = (1-snr1**2)**.5
 
 	# work out the time to coalescence at a given f
-	t = freq_to_time(mchirp(1.4,1.4),f) # FIXME dont hardcode masses
+	t = chirp_time(1.4, 1.4, f) # FIXME dont hardcode masses
 
 	# compute the number of sources detectable 
 	num = snr_to_num(snr1, number=40)
@@ -87,12 +69,13 @@ for i, (cfile, label) in enumerate(zip(['data/ZERO_DET_high_P.txt'], ['zero det'
 	numminus = snr_to_num(snr1, number=.4)
 
 	# generate the figure
-	ax1 = fig.add_subplot(1,1,1, adjustable='box')
-	pylab.loglog(t, num, markers[i], lw=2, label=label)
-	pylab.loglog(t, numminus, markers[i], lw=0.5)
-	pylab.loglog(t, numplus, markers[i], lw=0.5)
-	#pylab.hold(1)
-	pylab.fill_between(t, numminus, numplus, color='0.85')
+	with stage('plot'):
+		ax1 = fig.add_subplot(1,1,1, adjustable='box')
+		pylab.loglog(t, num, markers[i], lw=2, label=label)
+		pylab.loglog(t, numminus, markers[i], lw=0.5)
+		pylab.loglog(t, numplus, markers[i], lw=0.5)
+		#pylab.hold(1)
+		pylab.fill_between(t, numminus, numplus, color='0.85')
 
 pylab.grid()
 #pylab.legend(loc='lower left')
@@ -101,4 +84,6 @@ pylab.xlabel(r'time before coalescence (s)')
 pylab.subplots_adjust(bottom=0.2,top=0.95,left=0.15,right=0.95)
 pylab.xlim([1000, 0.])
 pylab.ylim([.1, 1000])
-pylab.savefig(sys.argv[1])
+with stage('savefig'):
+	pylab.savefig(sys.argv[1])
+report(sys.argv[1])
@@ -0,0 +1,233 @@
+"""
+Time and memory instrumentation of the named stages of the figure and table
+scripts.
+
+Each script wraps the parts of its work, such as imports, loading data,
+computing and plotting, in stages, and names its output when it is done:
+
+	with stage('load'):
+		f, asd = numpy.loadtxt(path).T
+	...
+	report(sys.argv[1])
+
+Stages nest, and library code may open stages of its own; a stage's name in
+the report is its path, such as 'load/parse_xml'. Every stage records its
+wall-clock and CPU time and the peak resident set size of the process when
+it ends. That costs next to nothing, so the stages are always timed, but
+nothing is written unless one of these environment variables is set:
+
+LLOID_STAGES=1
+	Also trace memory allocations with tracemalloc, to which NumPy reports
+	its arrays: each stage records the peak memory allocated above the level
+	at which it started, the net change, and the number, total size and
+	largest size of the arrays that are alive when it ends. report(path)
+	writes all of this to the JSON sidecar path + '.stages.json'. Tracing
+	slows down allocation-heavy code such as plotting several times over,
+	so compare the timings of traced runs only with each other.
+
+LLOID_PROFILE=name or LLOID_PROFILE=name:sample
+	Profile every occurrence of the stage with that name or path, with
+	cProfile or, with ':sample', by sampling the stack every millisecond of
+	CPU time (Unix only). The top functions go into the sidecar; cProfile
+	statistics are also saved to path + '.<name>.prof' for pstats.
+
+For example, LLOID_STAGES=1 LLOID_PROFILE=savefig make figures/asds.pdf.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('stage', 'report', 'records')
+
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import numpy
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+_enabled = bool(os.environ.get('LLOID_STAGES'))
+_profile_name, _, _profile_mode = os.environ.get('LLOID_PROFILE', '').partition(':')
+if _profile_mode not in ('', 'cprofile', 'sample'):
+	raise ValueError('LLOID_PROFILE mode must be cprofile or sample, not %r' % _profile_mode)
+
+# Domain of NumPy's allocations in tracemalloc
+_numpy_domain = 389047
+
+# Sampling interval of the sampling profiler in seconds of CPU time
+_sample_interval = 1e-3
+
+# Number of functions of the profile listed in the sidecar
+_profile_top = 25
+
+# One record per stage occurrence, in the order in which they started
+records = []
+
+_start_time = time.time()
+_names = []
+_peaks = []
+_profiler = None
+_previous_handler = None
+_samples = {}
+_profile_depth = 0
+
+
+def _peak_rss():
+	"""Peak resident set size of the process in bytes, or None if the
+	resource module is not available."""
+	try:
+		import resource
+	except ImportError:
+		return None
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on Mac OS
+	return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _cpu_time():
+	return sum(os.times()[:2])
+
+
+def _tracing():
+	return _enabled and tracemalloc is not None and hasattr(tracemalloc, 'reset_peak')
+
+
+def _array_sizes():
+	"""Number, total size and largest size in bytes of the live arrays."""
+	snapshot = tracemalloc.take_snapshot().filter_traces(
+		[tracemalloc.DomainFilter(True, _numpy_domain)])
+	sizes = [trace.size for trace in snapshot.traces]
+	return {'count': len(sizes), 'bytes': sum(sizes), 'largest': max(sizes) if sizes else 0}
+
+
+def _sample(signum, frame):
+	"""SIGPROF handler: count the innermost function of the interrupted stack
+	by itself, and every function on it inclusively."""
+	leaf = True
+	seen = set()
+	while frame is not None:
+		code = frame.f_code
+		key = '%s:%d(%s)' % (code.co_filename, code.co_firstlineno, code.co_name)
+		counts = _samples.setdefault(key, [0, 0])
+		if leaf:
+			counts[0] += 1
+			leaf = False
+		if key not in seen:
+			counts[1] += 1
+			seen.add(key)
+		frame = frame.f_back
+
+
+def _start_profile():
+	global _profiler, _previous_handler
+	if _profile_mode == 'sample':
+		import signal
+		if not hasattr(signal, 'setitimer'):
+			raise ValueError('sampling profiler needs signal.setitimer, which this platform lacks')
+		_previous_handler = signal.signal(signal.SIGPROF, _sample)
+		signal.setitimer(signal.ITIMER_PROF, _sample_interval, _sample_interval)
+	else:
+		if _profiler is None:
+			import cProfile
+			_profiler = cProfile.Profile()
+		_profiler.enable()
+
+
+def _stop_profile():
+	if _profile_mode == 'sample':
+		import signal
+		signal.setitimer(signal.ITIMER_PROF, 0)
+		signal.signal(signal.SIGPROF, _previous_handler)
+	else:
+		_profiler.disable()
+
+
+@contextlib.contextmanager
+def stage(name):
+	"""Context manager that instruments the enclosed code as the stage name."""
+	_names.append(name)
+	record = {'name': '/'.join(_names)}
+	records.append(record)
+	profile = _profile_name in (name, record['name'])
+	tracing = _tracing()
+	if tracing:
+		if not tracemalloc.is_tracing():
+			tracemalloc.start()
+		# The peak of tracemalloc is global, so before resetting it for this
+		# stage hand it on to the enclosing one.
+		current, peak = tracemalloc.get_traced_memory()
+		if _peaks:
+			_peaks[-1] = max(_peaks[-1], peak)
+		tracemalloc.reset_peak()
+		_peaks.append(current)
+	global _profile_depth
+	if profile:
+		if not _profile_depth:
+			_start_profile()
+		_profile_depth += 1
+	start_time = time.time()
+	start_cpu = _cpu_time()
+	try:
+		yield
+	finally:
+		record['seconds'] = time.time() - start_time
+		record['cpu_seconds'] = _cpu_time() - start_cpu
+		if profile:
+			_profile_depth -= 1
+			if not _profile_depth:
+				_stop_profile()
+		record['peak_rss_bytes'] = _peak_rss()
+		if tracing:
+			end, peak = tracemalloc.get_traced_memory()
+			peak = max(_peaks.pop(), peak)
+			record['peak_alloc_bytes'] = peak - current
+			record['net_alloc_bytes'] = end - current
+			record['arrays'] = _array_sizes()
+			if _peaks:
+				_peaks[-1] = max(_peaks[-1], peak)
+			tracemalloc.reset_peak()
+		_names.pop()
+
+
+def _profile_summary(path):
+	"""Top functions of the profile, and the path of the cProfile statistics
+	if any, which are saved next to the output at path."""
+	if _profile_mode == 'sample':
+		top = sorted(_samples.items(), key=lambda item: item[1][1], reverse=True)[:_profile_top]
+		return {'stage': _profile_name, 'mode': 'sample', 'interval': _sample_interval,
+			'samples': sum(counts[0] for counts in _samples.values()),
+			'functions': [{'function': key, 'self': counts[0], 'inclusive': counts[1]}
+				for key, counts in top]}
+	elif _profiler is not None:
+		import pstats
+		stats_path = '%s.%s.prof' % (path, _profile_name.replace('/', '.'))
+		_profiler.dump_stats(stats_path)
+		stats = pstats.Stats(_profiler).stats
+		top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:_profile_top]
+		return {'stage': _profile_name, 'mode': 'cprofile', 'stats': stats_path,
+			'functions': [{'function': '%s:%d(%s)' % key, 'calls': value[1],
+				'self_seconds': value[2], 'cumulative_seconds': value[3]}
+				for key, value in top]}
+	else:
+		return None
+
+
+def report(path):
+	"""Write the records of all stages so far, and the profile if any, to the
+	JSON sidecar of the output file at path, if LLOID_STAGES or LLOID_PROFILE
+	is set."""
+	if not (_enabled or _profile_name):
+		return
+	sidecar = path + '.stages.json'
+	result = {'script': sys.argv[0], 'output': path,
+		'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'python': platform.python_version(), 'numpy': numpy.__version__,
+		'seconds': time.time() - _start_time, 'peak_rss_bytes': _peak_rss(),
+		'stages': records, 'profile': _profile_summary(path)}
+	tmp_path = '%s.%d.tmp' % (sidecar, os.getpid())
+	with open(tmp_path, 'w') as f:
+		json.dump(result, f, indent=1)
+	os.rename(tmp_path, sidecar)
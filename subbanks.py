@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Split a template bank into chirp-mass-ordered sub-banks of roughly equal
+computational cost, and process the sub-banks in parallel.
+
+The cost of a template is estimated as the number of samples in its time
+slices: the signal is assumed to be sampled, at each moment, at the lowest
+power of 2 rate of at least twice its frequency, from f_low up to its ISCO
+frequency. Low-mass templates are long and so are much more expensive than
+high-mass ones. Sub-banks are contiguous ranges in chirp mass, with
+boundaries placed at equal quantiles of the cumulative cost.
+
+run_shards hands the sub-banks, most expensive first, to a pool of worker
+processes, reports progress, and saves each result to its own file as soon
+as it is ready. Sub-banks whose results already exist are skipped, so an
+interrupted run picks up where it left off.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('template_cost', 'partition', 'run_shards')
+
+import hashlib
+import os
+import os.path
+import sys
+import time
+import numpy
+from inspiral import chirp_mass, isco_frequency, freq_to_time
+
+
+def template_cost(m1, m2, f_low, max_rate=4096):
+	"""Estimated cost of templates of component masses m1 and m2 in M_sun
+	from f_low in Hz: the number of samples in all of their time slices,
+	at rates up to max_rate in Hz."""
+	Mc = chirp_mass(m1, m2)[..., numpy.newaxis]
+	f_high = numpy.minimum(isco_frequency(m1, m2), max_rate / 2.)[..., numpy.newaxis]
+	# Slices at rate r hold the part of the signal between r / 4 and r / 2.
+	rates = 2. ** numpy.arange(int(numpy.log2(max_rate)) + 1)
+	lo = numpy.maximum(rates / 4, f_low)
+	hi = numpy.minimum(rates / 2, f_high)
+	duration = numpy.where(hi > lo, freq_to_time(Mc, lo) - freq_to_time(Mc, numpy.maximum(hi, lo)), 0.)
+	return numpy.sum(duration * rates, axis=-1)
+
+
+def partition(mchirp, costs, num_shards):
+	"""Split templates into num_shards sub-banks that are contiguous in chirp
+	mass and of roughly equal total cost. Returns a list of arrays of
+	template indices, in order of increasing chirp mass."""
+	order = numpy.argsort(mchirp, kind='mergesort')
+	cumulative = numpy.cumsum(numpy.asarray(costs, dtype=float)[order])
+	targets = cumulative[-1] * numpy.arange(1, num_shards) / float(num_shards)
+	boundaries = numpy.searchsorted(cumulative, targets)
+	return [shard for shard in numpy.split(order, boundaries) if len(shard)]
+
+
+def _shard_path(output_dir, i, indices):
+	"""Result file of a sub-bank, named after its template indices, so that
+	results of a different partition are never mistaken for it."""
+	digest = hashlib.sha1(numpy.ascontiguousarray(indices, dtype=numpy.int64).tobytes()).hexdigest()
+	return os.path.join(output_dir, 'shard-%04d-%s.npz' % (i, digest[:12]))
+
+
+def _run_shard(args):
+	func, i, indices, path = args
+	start = time.time()
+	result = func(indices)
+	tmp_path = '%s.%d.tmp' % (path, os.getpid())
+	with open(tmp_path, 'wb') as f:
+		numpy.savez(f, indices=indices, **result)
+	os.rename(tmp_path, path)
+	return i, time.time() - start
+
+
+def run_shards(func, shards, output_dir, costs=None, processes=None, progress=sys.stderr):
+	"""Call func on the template indices of each sub-bank (as returned by
+	partition) and save the dict of arrays that it returns, together with
+	the indices, to a .npz file in output_dir. func must be picklable, e.g.
+	a module-level function or a functools.partial of one.
+
+	If costs, the cost of each template, are given, the most expensive
+	sub-banks are started first so that no worker is left with a long one at
+	the end, and progress is reported as a fraction of the total cost. If
+	processes is given, sub-banks are processed by a pool of that many
+	worker processes. Progress is written to the file progress, unless it is
+	None.
+
+	Returns the list of result file names, one per sub-bank."""
+	if not os.path.isdir(output_dir):
+		os.makedirs(output_dir)
+	paths = [_shard_path(output_dir, i, indices) for i, indices in enumerate(shards)]
+	if costs is None:
+		shard_costs = numpy.array([len(indices) for indices in shards], dtype=float)
+	else:
+		costs = numpy.asarray(costs, dtype=float)
+		shard_costs = numpy.array([costs[indices].sum() for indices in shards])
+	pending = [i for i, path in enumerate(paths) if not os.path.exists(path)]
+	pending.sort(key=lambda i: -shard_costs[i])
+	total_cost = shard_costs.sum()
+	done_cost = total_cost - shard_costs[pending].sum()
+	if progress is not None and len(pending) < len(shards):
+		progress.write('resuming: %d of %d sub-banks already done\n' % (len(shards) - len(pending), len(shards)))
+
+	work = [(func, i, shards[i], paths[i]) for i in pending]
+	if processes:
+		from multiprocessing import Pool
+		pool = Pool(processes)
+		results = pool.imap_unordered(_run_shard, work)
+	else:
+		pool = None
+		results = (_run_shard(args) for args in work)
+	try:
+		for count, (i, elapsed) in enumerate(results):
+			done_cost += shard_costs[i]
+			if progress is not None:
+				progress.write('[%d/%d, %.1f%% of cost] sub-bank %d: %d templates in %.1f s\n' % (
+					count + 1, len(pending), 100 * done_cost / total_cost, i, len(shards[i]), elapsed))
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+	return paths
+
+
+if __name__ == '__main__':
+	from optparse import OptionParser, Option
+	from bankcache import load_columns
+	opts, args = OptionParser(description = __doc__, usage = '%prog [options] BANK.xml', option_list = [
+		Option("--flow", type="float", default=40., metavar="Hz",
+			help="low frequency cutoff (default: %default)"),
+		Option("--num-shards", type="int", default=16,
+			help="number of sub-banks (default: %default)"),
+	]).parse_args()
+	if len(args) != 1:
+		raise ValueError("Expected one template bank file")
+
+	mass1, mass2, mchirp = load_columns(args[0], ('mass1', 'mass2', 'mchirp'))
+	costs = template_cost(mass1, mass2, opts.flow)
+	sys.stdout.write("sub-bank  min mchirp  max mchirp  templates  relative cost\n")
+	for i, indices in enumerate(partition(mchirp, costs, opts.num_shards)):
+		sys.stdout.write("%8d  %10.4f  %10.4f  %9d  %13.3f\n" % (i, mchirp[indices].min(), mchirp[indices].max(),
+			len(indices), costs[indices].sum() * opts.num_shards / costs.sum()))
@@ -0,0 +1,174 @@
+"""
+Truncated singular value decomposition of time-sliced template matrices,
+with an on-disk cache of the factorizations.
+
+Each slice is factored by a randomized range finder that adds blocks of
+basis vectors until the retained singular values account for the requested
+fraction of the sum of all squared singular values, the same tolerance as
+lloid.svd_basis. The factorization is stored in data/cache/svd, keyed by a
+hash of the bank and the slice index, together with the tolerance that it
+reaches and the part of the slice that it misses. A later request for that
+slice at the same or a lower tolerance is served by truncating the stored
+factors, so sweeping tolerances from 0.9 to 0.999999 costs one
+factorization per slice.
+"""
+__author__ = "Leo Singer <leo.singer@ligo.org>"
+__all__ = ('truncated_svd', 'bank_hash', 'SVDCache', 'decompose_bank')
+
+import hashlib
+import os
+import os.path
+import numpy
+from lloid import slice_templates
+
+default_cache_dir = os.path.join(
+	os.path.dirname(os.path.abspath(__file__)), 'data', 'cache', 'svd')
+
+
+def _num_kept(s, residual, total, tolerance):
+	"""Fewest leading singular values s of a factorization that misses the
+	squared Frobenius norm residual of a matrix of squared Frobenius norm
+	total, such that the truncated factorization accounts for at least the
+	fraction tolerance of total, or None if even all of them fall short."""
+	# Squared error of keeping the first k singular values, for k = 0, ..., len(s)
+	error = residual + numpy.concatenate((numpy.cumsum((s**2)[::-1])[::-1], [0.]))
+	k = int(numpy.argmax(error <= (1 - tolerance) * total))
+	return k if error[k] <= (1 - tolerance) * total else None
+
+
+def _orthonormal_extension(Y, Q):
+	"""Orthonormal basis of the part of the span of Y that is orthogonal to
+	the orthonormal columns of Q. Y is projected out of Q twice, since once
+	loses orthogonality when most of Y lies in the span of Q, and directions
+	whose residual is negligible are dropped."""
+	scale = numpy.linalg.norm(Y, 2)
+	for i in range(2):
+		Y = Y - numpy.dot(Q, numpy.dot(Q.T, Y))
+	u, sv, _ = numpy.linalg.svd(Y, full_matrices=False)
+	return u[:, sv > max(Y.shape) * numpy.finfo(float).eps * scale]
+
+
+def truncated_svd(matrix, tolerance, block_size=16, power_iterations=2, seed=0):
+	"""Truncated SVD (u, s, vh) of matrix, with just enough singular values
+	to account for the fraction tolerance of the sum of squared singular
+	values, computed by an adaptive randomized range finder. Falls back to a
+	dense SVD when the basis would grow to the full rank.
+
+	The range finder samples the residual R = A - Q Q^T A of the basis Q found
+	so far, and stops once the squared Frobenius norm of R is within the
+	tolerance; the error of the truncated factorization is that of R plus the
+	singular values that are left out."""
+	A = numpy.asarray(matrix, dtype=float)
+	m, n = A.shape
+	total = numpy.sum(A**2)
+	if total == 0:
+		return A[:, :0], numpy.zeros(0), A[:0]
+	random_state = numpy.random.RandomState(seed)
+	Q = numpy.zeros((m, 0))
+	R = A.copy()
+	while Q.shape[1] + block_size < min(m, n):
+		Y = numpy.dot(R, random_state.randn(n, block_size))
+		for i in range(power_iterations):
+			Y, _ = numpy.linalg.qr(Y)
+			Y = numpy.dot(R, numpy.dot(R.T, Y))
+		Y = _orthonormal_extension(Y, Q)
+		Q = numpy.hstack((Q, Y))
+		R -= numpy.dot(Y, numpy.dot(Y.T, R))
+		if len(Y.T) == 0 or numpy.sum(R**2) <= (1 - tolerance) * total:
+			B = numpy.dot(Q.T, A)
+			residual = numpy.sum((A - numpy.dot(Q, B))**2)
+			ub, s, vh = numpy.linalg.svd(B, full_matrices=False)
+			k = _num_kept(s, residual, total, tolerance)
+			if k is not None:
+				return numpy.dot(Q, ub[:, :k]), s[:k], vh[:k]
+			if len(Y.T) == 0:
+				break
+	u, s, vh = numpy.linalg.svd(A, full_matrices=False)
+	k = _num_kept(s, 0., total, tolerance)
+	return u[:, :k], s[:k], vh[:k]
+
+
+def bank_hash(templates, rate, slices):
+	"""SHA-1 hex digest identifying a bank of full-rate templates and its
+	time slice table."""
+	sha = hashlib.sha1()
+	templates = numpy.ascontiguousarray(templates, dtype=float)
+	sha.update(str(templates.shape).encode('ascii'))
+	sha.update(templates.tobytes())
+	sha.update(repr(float(rate)).encode('ascii'))
+	for row in slices:
+		sha.update(repr((int(row['rate']), float(row['begin']), float(row['end']))).encode('ascii'))
+	return sha.hexdigest()
+
+
+class SVDCache(object):
+	"""Directory of cached slice factorizations."""
+
+	def __init__(self, directory=default_cache_dir):
+		self.directory = directory
+
+	def _path(self, key, slice_index):
+		return os.path.join(self.directory, '%s-%d.npz' % (key, slice_index))
+
+	def decompose(self, matrix, tolerance, key, slice_index, **kwargs):
+		"""Basis filters, singular values and reconstruction matrix of the
+		slice slice_index of the bank identified by key, at tolerance. The
+		(L, N) basis and (M, L) reconstruction matrix may be passed directly
+		to lloid.LLOIDFilter. Extra keyword arguments go to truncated_svd."""
+		path = self._path(key, slice_index)
+		cached = self._load(path)
+		if cached is not None and cached['tolerance'] >= tolerance:
+			u, s, vh = cached['u'], cached['s'], cached['vh']
+			k = _num_kept(s, cached['residual'], cached['total'], tolerance)
+			if k is None:
+				k = len(s)
+			u, s, vh = u[:, :k], s[:k], vh[:k]
+		else:
+			A = numpy.asarray(matrix, dtype=float)
+			u, s, vh = truncated_svd(A, tolerance, **kwargs)
+			self._save(path, u=u, s=s, vh=vh, tolerance=tolerance,
+				total=numpy.sum(A**2),
+				residual=numpy.sum((A - numpy.dot(u * s, vh))**2))
+		return vh, s, u * s
+
+	def _load(self, path):
+		"""Arrays of the cached factorization at path, or None if there is
+		none or it predates the residual entry."""
+		try:
+			with numpy.load(path) as cached:
+				if 'residual' not in cached.files:
+					return None
+				return dict((name, cached[name]) for name in cached.files)
+		except (IOError, OSError):
+			return None
+
+	def _save(self, path, **arrays):
+		try:
+			if not os.path.isdir(self.directory):
+				os.makedirs(self.directory)
+			# Write to a temporary name first so that concurrent readers never
+			# see a partially written file.
+			tmp_path = '%s.%d.tmp' % (path, os.getpid())
+			with open(tmp_path, 'wb') as f:
+				numpy.savez(f, **arrays)
+			os.rename(tmp_path, path)
+		except (IOError, OSError):
+			pass
+
+
+def decompose_bank(templates, rate, slices, tolerances, cache=None, **kwargs):
+	"""Decompose a bank of full-rate templates (see lloid.slice_templates)
+	at each of several SVD tolerances. Every slice is factored once, at the
+	highest tolerance; the others are truncations. Returns a dict mapping
+	each tolerance to a list of (basis, reconstruction) pairs, one per
+	slice."""
+	if cache is None:
+		cache = SVDCache()
+	key = bank_hash(templates, rate, slices)
+	tolerances = sorted(tolerances, reverse=True)
+	result = dict((tolerance, []) for tolerance in tolerances)
+	for i, matrix in enumerate(slice_templates(templates, rate, slices)):
+		for tolerance in tolerances:
+			basis, s, reconstruction = cache.decompose(matrix, tolerance, key, i, **kwargs)
+			result[tolerance].append((basis, reconstruction))
+	return result
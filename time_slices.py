@@ -2,21 +2,13 @@
 
 # Imports
 
+from stages import stage, report
 from optparse import OptionParser, Option
-from gstlal.templates import time_slices
-from pylal import spawaveform
+import sys
 import numpy as np
-import matplotlib
-import pylab
-from itertools import groupby, izip
-matplotlib.rcParams.update({
-        "figure.figsize": (3,2.8),
-        "subplots.left": 0.1,
-        "subplots.right": 0.75,
-        "subplots.bottom": 0.25,
-        "subplots.top": 0.75,
-		"legend.fontsize": 8.0
-})
+from itertools import groupby
+from inspiral import chirp_mass, isco_frequency
+from plotutil import headless
 
 # Command line interface
 
@@ -24,6 +16,10 @@ opts, args = OptionParser(description = __doc__, option_list = [
 	Option("--mass1", type="float", metavar="solar masses", help="component mass 1"),
 	Option("--mass2", type="float", metavar="solar masses", help="component mass 2"),
 	Option("--flow", type="float", metavar="Hz", help="low frequency cutoff"),
+	Option("--native", action="store_true", default=False,
+		help="place time slices with slice_planner instead of gstlal"),
+	Option("--max-latency", type="float", metavar="seconds",
+		help="latency ceiling for --native (default: unlimited)"),
 ]).parse_args()
 
 if len(args) > 0:
@@ -35,12 +31,65 @@ for key in ("mass1", "mass2", "flow"):
 
 # Place time slices
 
-fhigh = 4400. / (opts.mass1 + opts.mass2)
-mass_pairs = ((opts.mass1, opts.mass2), )
-slices = time_slices(mass_pairs, opts.flow, fhigh)
-mc = spawaveform.chirpmass(opts.mass1, opts.mass2)
+with stage('slices'):
+	fhigh = isco_frequency(opts.mass1, opts.mass2)
+	if opts.native:
+		from slice_planner import plan_time_slices
+		plan = plan_time_slices(opts.mass1, opts.mass2, opts.flow, fhigh,
+			max_latency=opts.max_latency if opts.max_latency is not None else np.inf)
+		slices = plan.slices
+	else:
+		from gstlal.templates import time_slices
+		mass_pairs = ((opts.mass1, opts.mass2), )
+		slices = time_slices(mass_pairs, opts.flow, fhigh)
+mc = chirp_mass(opts.mass1, opts.mass2)
+
+# Generate output table
+
+sys.stdout.write(r"\begin{tabular}{lrr}" + "\n")
+#FIXME change the symbol for the number of sample points per slice if the macro changes
+sys.stdout.write(r"$f^s$ (Hz) & $\left(t^{s+1}, t^s\right]$ (s) & $\slicessamps$ \\" + "\n")
+sys.stdout.write(r"\hline" + "\n")
+for slice in slices:
+	begin = slice['begin']
+	sys.stdout.write(r"%(rate)d & $(%(end)g, %(begin)g]$ & %(samples)d \\" % {'begin': begin, 'end': slice['end'], 'rate': slice['rate'], 'samples': int(round((slice['end'] - slice['begin']) * slice['rate']))} + "\n")
+sys.stdout.write(r"\end{tabular}" + "\n")
+
+# Write latency
+
+with open("time_slice_latency.tex", "w") as f:
+	f.write(r"%g~\mathrm{s}" % max(2 * (slice['end'] - slice['begin']) - slice['begin'] for slice in slices))
+
+# Write operation count
+
+rank_reduction = 0.1
+block_length_factor = 2.
+resample_kernel_length = 64
+kernel_length = (slices['end'] - slices['begin']) * slices['rate']
+raw_kernel_length = (max(slices['end']) - min(slices['begin'])) * max(slices['rate'])
+with open("time_slice_ops_firslice.tex", "w") as f:
+	f.write(r"%d" % int(2 * len(slices) + round(sum(slices['rate'] / float(max(slices['rate'])) * ((8. * np.log2(block_length_factor * kernel_length) + 2) / (1 - 1. / block_length_factor) + 4 * resample_kernel_length)))) + "\n")
+with open("time_slice_ops_conv.tex", "w") as f:
+	f.write(r"%d" % int(round( (8 * np.log2(block_length_factor * raw_kernel_length) + 2) / (1 - 1. / block_length_factor))) + "\n")
+with open("time_slice_ops_td.tex", "w") as f:
+	f.write(r"%.1f \times 10^6" % (2 * raw_kernel_length * 1e-6) + "\n")
+
+# Generate plot, importing matplotlib only now so that the tables do not
+# wait for it
+
+with stage('import'):
+	headless()
+	import matplotlib
+	import pylab
+matplotlib.rcParams.update({
+        "figure.figsize": (3,2.8),
+        "subplots.left": 0.1,
+        "subplots.right": 0.75,
+        "subplots.bottom": 0.25,
+        "subplots.top": 0.75,
+		"legend.fontsize": 8.0
+})
 
-# Generate plot
 pylab.figure()
 ax = pylab.subplot(111)
 tmin = min(slice['begin'] for slice in slices)
@@ -49,7 +98,7 @@ legend_artists = []
 legend_labels = []
 rate_key = lambda x: x['rate']
 num_rates = len(set([x[0] for x in sorted(slices, key = rate_key)]))
-for color, (rate, more_slices) in izip(pylab.linspace(1., 0., num_rates), groupby(sorted(slices, key = rate_key), key = rate_key)):
+for color, (rate, more_slices) in zip(pylab.linspace(1., 0., num_rates), groupby(sorted(slices, key = rate_key), key = rate_key)):
 	legend_artists += [pylab.Rectangle((0, 0), 1, 1, facecolor = str(color))]
 	legend_labels += ['%d Hz' % rate]
 	for slice in more_slices:
@@ -65,31 +114,7 @@ pylab.xlabel('time relative to coalescence (s)')
 pylab.ylabel(r'gravitational wave strain amplitude')
 matplotlib.pyplot.subplots_adjust(left=0.06, right=0.88, top=0.95, bottom=0.13)
 
-pylab.savefig('time_slices.pdf')
-
-
-# Generate output table
+with stage('savefig'):
+	pylab.savefig('time_slices.pdf')
 
-print r"\begin{tabular}{lrr}"
-#FIXME change the symbol for the number of sample points per slice if the macro changes
-print r"$f^s$ (Hz) & $\left(t^{s+1}, t^s\right]$ (s) & $\slicessamps$ \\"
-print r"\hline"
-for slice in slices:
-	begin = slice['begin']
-	print r"%(rate)d & $(%(end)g, %(begin)g]$ & %(samples)d \\" % {'begin': begin, 'end': slice['end'], 'rate': slice['rate'], 'samples': int(round((slice['end'] - slice['begin']) * slice['rate']))}
-print r"\end{tabular}"
-
-# Write latency
-
-print >>open("time_slice_latency.tex", "w"), (r"%g~\mathrm{s}" % max(2 * (slice['end'] - slice['begin']) - slice['begin'] for slice in slices)),
-
-# Write operation count
-
-rank_reduction = 0.1
-block_length_factor = 2.
-resample_kernel_length = 64
-kernel_length = (slices['end'] - slices['begin']) * slices['rate']
-raw_kernel_length = (max(slices['end']) - min(slices['begin'])) * max(slices['rate'])
-print >>open("time_slice_ops_firslice.tex", "w"), r"%d" % int(2 * len(slices) + round(sum(slices['rate'] / float(max(slices['rate'])) * ((8. * np.log2(block_length_factor * kernel_length) + 2) / (1 - 1. / block_length_factor) + 4 * resample_kernel_length))))
-print >>open("time_slice_ops_conv.tex", "w"), r"%d" % int(round( (8 * np.log2(block_length_factor * raw_kernel_length) + 2) / (1 - 1. / block_length_factor)))
-print >>open("time_slice_ops_td.tex", "w"), r"%.1f \times 10^6" % (2 * raw_kernel_length * 1e-6)
+report('time_slices.pdf')